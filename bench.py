@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+#
+# python bench.py words|decompress|formats|blocks|stream|dehuff|lzhuff|pi|pipool|pimethods|fraction [size ...]
+# python bench.py suite [size ...] [--json out.json] [--baseline old.json]
+#
+# The suite skips whatever modules can't be imported. With --baseline it exits
+# with status 1 if any metric got worse by more than --threshold.
+
+import sys,time,math,random,fractions,functools,resource,tempfile,argparse,json,platform
+import multiprocessing
+
+def load(name):
+
+  try:
+    return __import__(name)
+  except ImportError:
+    return None
+
+compress = load('compress')
+huffman = load('huffman')
+lzhuff = load('lzhuff')
+fraction = load('fraction')
+monte_carlo_pi = load('monte_carlo_pi')
+
+SIZES = [100*1000,1000*1000,10*1000*1000]
+REFERENCE_LIMIT = 100*1000
+FORMATS = [(12,4),(16,4),(16,8),(20,8)]
+STREAM_SIZES = [1000*1000*1000]
+STREAM_MEMORY = 64*1024*1024
+LZHUFF_PEAK_MB = 64
+
+SUITE_SIZES = [10*1000,100*1000]
+SUITE_KINDS = ['text','logs','random','repetitive']
+FRACTION_OPS = 50*1000
+FRACTION_CHAIN = 2000
+PARSE_DISTINCT = 1000
+PI_SAMPLES = 10*1000*1000
+PI_SIZES = [1000*1000,10*1000*1000,100*1000*1000]
+PI_REFERENCE_LIMIT = 1000*1000
+PI_METHOD_SIZES = [10*1000,100*1000,1000*1000,10*1000*1000]
+PI_SEEDS = 10
+REPEAT = 5
+THRESHOLD = 0.2
+# peak memory below this many MB is mostly noise
+MEMORY_FLOOR = 1.0
+LOWER_IS_BETTER = ['ratio','peak_mb']
+
+WORDS = ['alpha','beta','gamma','delta','error','warning','info','request',
+    'server','client','timeout','connection','retry','session','worker']
+
+def corpus(size,seed=0,kind='logs'):
+
+  r = random.Random(seed)
+  if kind=='random':
+    # compress drops its escape byte, so leave one byte value free for it
+    return bytes([r.randint(1,255) for _ in range(size)])
+  elif kind=='telemetry':
+    s = telemetry(size,r)
+  elif kind=='text':
+    s = text(size,r)
+  elif kind=='repetitive':
+    s = repetitive(size,r)
+  elif kind=='periodic':
+    # no blacklisted spaces, so one repeat can run across the whole input
+    s = repetitive(size,r,'the_quick_brown_fox_jumps_over_the_lazy_dog;_')
+  else:
+    s = logs(size,r)
+  return s.encode('latin-1')
+
+def logs(size,r):
+
+  words = WORDS
+  lines = []
+  total = 0
+  while total<size:
+    line = '2016-%02d-%02d %02d:%02d:%02d [%s] %s.%s id=%d %s\n' % (
+        r.randint(1,12),r.randint(1,28),r.randint(0,23),r.randint(0,59),
+        r.randint(0,59),r.choice(words).upper(),r.choice(words),
+        r.choice(words),r.randint(0,99999),
+        ' '.join(r.choice(words) for _ in range(r.randint(1,6))))
+    lines.append(line)
+    total += len(line)
+  return ''.join(lines)[:size]
+
+def telemetry(size,r):
+
+  records = []
+  total = 0
+  while total<size:
+    record = ('{"host":"node-%02d","sensor":"temperature-%d","unit":"celsius",'
+        '"status":"nominal","firmware":"2.4.%d","value":%d}\n' % (
+        r.randint(0,31),r.randint(0,3),r.randint(0,2),r.randint(0,50)))
+    records.append(record)
+    total += len(record)
+  return ''.join(records)[:size]
+
+def text(size,r):
+
+  sentences = []
+  total = 0
+  while total<size:
+    words = [r.choice(WORDS) for _ in range(r.randint(3,15))]
+    sentence = ' '.join(words).capitalize()+r.choice(['.','.','.','?','!'])
+    sentence += '\n\n' if r.random()<0.1 else ' '
+    sentences.append(sentence)
+    total += len(sentence)
+  return ''.join(sentences)[:size]
+
+# a short pattern over and over, with one character changed every so often
+def repetitive(size,r,pattern='the quick brown fox jumps over the lazy dog; '):
+
+  s = list((pattern*(size//len(pattern)+1))[:size])
+  for i in range(0,size,1000):
+    j = min(i+r.randint(0,999),size-1)
+    s[j] = chr(r.randint(32,126))
+  return ''.join(s)
+
+# A read()-able file of corpus text that is generated a piece at a time, so
+# that huge inputs never exist in memory all at once
+class SyntheticFile(object):
+
+  def __init__(self,size,piece=1000*1000):
+
+    self.size = size
+    self.piece = piece
+    self.pos = 0
+    self.buf = b''
+
+  def read(self,n=-1):
+
+    if n<0:
+      n = self.size-self.pos
+    n = min(n,self.size-self.pos)
+    while len(self.buf)<n:
+      self.buf += corpus(self.piece,seed=(self.pos+len(self.buf))//self.piece)
+    (s,self.buf) = (self.buf[:n],self.buf[n:])
+    self.pos += n
+    return s
+
+# a write()-able sink that checks everything written against a SyntheticFile
+class CheckFile(object):
+
+  def __init__(self,size):
+
+    self.expected = SyntheticFile(size)
+
+  def write(self,s):
+
+    if self.expected.read(len(s))!=s:
+      raise RuntimeError('round trip failed at byte %s' % self.expected.pos)
+
+def peak_memory():
+
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+# the dictionary loop compress() used before WordIndex, kept for comparison
+def reference_words(s):
+
+  replace = {}
+  i = 0
+  done = len(s)-(compress.MIN_COUNT+1)*compress.MIN_WORD
+  while i<done:
+    for l in range(compress.MAX_WORD+compress.MIN_WORD-1,compress.MIN_WORD-1,-1):
+      word = s[i:i+l]
+      if any(x in word for x in compress.BLACKLIST):
+        continue
+      if word in replace:
+        break
+      replace[word] = s.count(word)
+    i += 1
+  return [(k,v) for (k,v) in replace.items() if v>compress.MIN_COUNT]
+
+# the backwards decoder decompress() used before, kept for comparison
+def reference_decompress(outstr):
+
+  escape = outstr[:1]
+  s = outstr[1:]
+  i = len(s)-2
+  while i>=0:
+    if s[i:i+1]==escape:
+      (rel,length) = compress.FORMAT.decode(s[i+1:i+3])
+      s = s[:i]+s[i-rel:i-rel+length]+s[i+3:]
+    i -= 1
+  return s
+
+# the bit-at-a-time decoder dehuff() used before DecodeTable, kept for comparison
+def reference_dehuff(instr):
+
+  state = {'string':instr,'hanging':''}
+
+  def next_bit():
+    if not state['hanging']:
+      if not state['string']:
+        return None
+      state['hanging'] = bin(state['string'][0])[2:].zfill(8)
+      state['string'] = state['string'][1:]
+    bit = state['hanging'][0]
+    state['hanging'] = state['hanging'][1:]
+    return bit
+
+  stream = huffman.BitReader(instr)
+  decode = stream.parse_code_table()
+  state['string'] = instr[(stream.pos+7)//8:]
+  state['hanging'] = bin(instr[stream.pos//8])[2:].zfill(8)[stream.pos%8:] if stream.pos%8 else ''
+
+  s = bytearray()
+  working = ''
+  while True:
+    bit = next_bit()
+    if bit is None:
+      return bytes(s)
+    working += bit
+    char = decode.get(working,None)
+    if char is not None:
+      s.append(char)
+      working = ''
+
+# the point at a time loop monte_carlo_pi used before NumPy, kept for comparison
+def reference_pi(n):
+
+  r = random.SystemRandom()
+  circle = 0
+  for i in range(n):
+    x = r.random()*2-1
+    y = r.random()*2-1
+    if x**2+y**2<=1:
+      circle += 1
+  return circle
+
+# the operators fraction.Fraction had before its fast path, kept for comparison:
+# every call went through a parsing decorator and a pure Python gcd
+def reference_operands(func):
+
+  @functools.wraps(func)
+  def decorate(*args):
+    try:
+      args = [ReferenceFraction.parse(x) for x in args]
+    except TypeError:
+      return NotImplemented
+    return func(*args)
+  return decorate
+
+class ReferenceFraction(object):
+
+  def __init__(self,n,d=1):
+
+    if d==0:
+      raise ZeroDivisionError
+    neg = -1 if n*d<0 else 1
+    (n,d) = map(abs,(n,d))
+    g = ReferenceFraction.gcd(n,d)
+    (self.n,self.d) = (neg*n//g,d//g)
+
+  @staticmethod
+  def parse(x):
+
+    if isinstance(x,ReferenceFraction):
+      return x
+    elif isinstance(x,int):
+      return ReferenceFraction(x,1)
+    raise TypeError
+
+  @staticmethod
+  def gcd(a,b):
+
+    while b:
+      (a,b) = (b,a%b)
+    return abs(a)
+
+  @staticmethod
+  def lcm(a,b):
+
+    return abs(a*b//ReferenceFraction.gcd(a,b))
+
+  def __invert__(self):
+
+    return ReferenceFraction(self.d,self.n)
+
+  @reference_operands
+  def __add__(self,f):
+
+    l = ReferenceFraction.lcm(self.d,f.d)
+    return ReferenceFraction(self.n*l//self.d+f.n*l//f.d,l)
+
+  @reference_operands
+  def __mul__(self,f):
+
+    return ReferenceFraction(self.n*f.n,self.d*f.d)
+
+  @reference_operands
+  def __truediv__(self,f):
+
+    return self*(~f)
+
+  @reference_operands
+  def __lt__(self,f):
+
+    l = ReferenceFraction.lcm(self.d,f.d)
+    return (self.n*l//self.d)<(f.n*l//f.d)
+
+def bench_words(sizes):
+
+  print('%10s %10s %12s %12s %8s' % ('size','words','index sec','old sec','speedup'))
+  for size in sizes:
+    s = corpus(size)
+    tic = time.time()
+    words = compress.WordIndex(s,len(s)-(compress.MIN_COUNT+1)*compress.MIN_WORD)
+    new = time.time()-tic
+    if size<=REFERENCE_LIMIT:
+      tic = time.time()
+      reference_words(s)
+      old = time.time()-tic
+      print('%10s %10s %12.3f %12.3f %7.1fx' % (size,len(words),new,old,old/new))
+    else:
+      print('%10s %10s %12.3f %12s %8s' % (size,len(words),new,'-','-'))
+
+def bench_decompress(sizes):
+
+  print('%10s %10s %12s %12s %8s' % ('size','archive','new sec','old sec','speedup'))
+  for size in sizes:
+    s = corpus(size)
+    archive = compress.compress(s)
+    tic = time.time()
+    if compress.decompress(archive)!=s:
+      raise RuntimeError('decompress failed for size %s' % size)
+    new = time.time()-tic
+    if size<=REFERENCE_LIMIT:
+      tic = time.time()
+      reference_decompress(archive)
+      old = time.time()-tic
+      print('%10s %10s %12.3f %12.3f %7.1fx' % (size,len(archive),new,old,old/new))
+    else:
+      print('%10s %10s %12.3f %12s %8s' % (size,len(archive),new,'-','-'))
+
+def bench_formats(sizes):
+
+  print('%10s %10s %8s %8s %10s %10s' % ('kind','size','format','ratio','c MB/s','d MB/s'))
+  for size in sizes:
+    for kind in ['logs','telemetry','periodic']:
+      s = corpus(size,kind=kind)
+      for (rel_bits,word_bits) in FORMATS:
+        tic = time.time()
+        archive = compress.compress(s,rel_bits,word_bits)
+        c = time.time()-tic
+        tic = time.time()
+        if compress.decompress(archive)!=s:
+          raise RuntimeError('decompress failed for %s/%s' % (rel_bits,word_bits))
+        d = time.time()-tic
+        print('%10s %10s %8s %7.1f%% %10.3f %10.3f' % (kind,size,
+            '%s/%s' % (rel_bits,word_bits),100.0*len(archive)/len(s),
+            size/c/1e6,size/d/1e6))
+
+def bench_blocks(sizes):
+
+  counts = [1]
+  while counts[-1]*2<=multiprocessing.cpu_count():
+    counts.append(counts[-1]*2)
+
+  print('%10s %8s %10s %10s %10s' % ('size','workers','c MB/s','d MB/s','speedup'))
+  for size in sizes:
+    s = corpus(size)
+    base = None
+    for workers in counts:
+      tic = time.time()
+      archive = compress.compress_blocks(s,workers=workers)
+      c = time.time()-tic
+      tic = time.time()
+      if compress.decompress(archive,workers)!=s:
+        raise RuntimeError('decompress failed with %s workers' % workers)
+      d = time.time()-tic
+      base = base or c
+      print('%10s %8s %10.3f %10.3f %9.1fx' % (size,workers,size/c/1e6,
+          size/d/1e6,base/c))
+
+def bench_stream(sizes):
+
+  codecs = [
+    ('compress',compress.compress_stream,compress.decompress_stream),
+    ('huffman',huffman.huff_stream,huffman.dehuff_stream),
+  ]
+
+  print('%10s %12s %10s %10s %10s' % ('codec','size','c MB/s','d MB/s','peak MB'))
+  for size in sizes:
+    for (name,encode,decode) in codecs:
+      before = peak_memory()
+      with tempfile.TemporaryFile() as f:
+        tic = time.time()
+        encode(SyntheticFile(size),f)
+        c = time.time()-tic
+        f.seek(0)
+        tic = time.time()
+        decode(f,CheckFile(size))
+        d = time.time()-tic
+      grown = peak_memory()-before
+      print('%10s %12s %10.3f %10.3f %10.1f' % (name,size,size/c/1e6,size/d/1e6,
+          grown/1e6))
+      if grown>STREAM_MEMORY:
+        raise RuntimeError('%s grew peak memory by %s bytes' % (name,grown))
+
+def bench_dehuff(sizes):
+
+  print('%10s %10s %12s %12s %8s' % ('size','coded','new sec','old sec','speedup'))
+  for size in sizes:
+    s = corpus(size)
+    coded = huffman.huff(s)
+    tic = time.time()
+    if huffman.dehuff(coded)!=s:
+      raise RuntimeError('dehuff failed for size %s' % size)
+    new = time.time()-tic
+    if size<=REFERENCE_LIMIT:
+      tic = time.time()
+      if reference_dehuff(coded)!=s:
+        raise RuntimeError('reference dehuff failed for size %s' % size)
+      old = time.time()-tic
+      print('%10s %10s %12.3f %12.3f %7.1fx' % (size,len(coded),new,old,old/new))
+    else:
+      print('%10s %10s %12.3f %12s %8s' % (size,len(coded),new,'-','-'))
+
+# Each lzhuff run is also measured in a fresh process, since the match stage
+# once took gigabytes on repetitive input, and fails past LZHUFF_PEAK_MB. The
+# processes all start first, because they inherit this one's peak memory.
+def bench_lzhuff(sizes):
+
+  kinds = ['logs','telemetry','repetitive']
+  peaks = {}
+  for size in sizes:
+    for kind in kinds:
+      peak = run_case(codec_case,lzhuff.lzhuff,lzhuff.unlzhuff,kind,size)['peak_mb']
+      if peak>LZHUFF_PEAK_MB:
+        raise RuntimeError('lzhuff used %.1f MB for %s/%s' % (peak,kind,size))
+      peaks[(kind,size)] = peak
+
+  print('%10s %10s %10s %10s %10s %10s %10s' % ('kind','size','compress','huffman','both','lzhuff','peak MB'))
+  for size in sizes:
+    for kind in kinds:
+      s = corpus(size,kind=kind)
+      archive = compress.compress(s)
+      coded = lzhuff.lzhuff(s)
+      if lzhuff.unlzhuff(coded)!=s:
+        raise RuntimeError('lzhuff failed for %s/%s' % (kind,size))
+      ratios = [len(archive),len(huffman.huff(s)),len(huffman.huff(archive)),len(coded)]
+      print('%10s %10s %s %10.1f' % (kind,size,
+          ' '.join(['%9.1f%%' % (100.0*x/len(s)) for x in ratios]),peaks[(kind,size)]))
+
+# Runs func(*args) in a fresh process, so that each case's peak memory is its
+# own, and returns its dict of metrics with the peak memory growth added
+def run_case(func,*args):
+
+  queue = multiprocessing.Queue()
+  proc = multiprocessing.Process(target=measure,args=(queue,func,args))
+  proc.start()
+  (error,metrics) = queue.get()
+  proc.join()
+  if error:
+    raise RuntimeError(error)
+  return metrics
+
+def measure(queue,func,args):
+
+  try:
+    before = peak_memory()
+    metrics = func(*args)
+    metrics['peak_mb'] = (peak_memory()-before)/1e6
+    queue.put((None,metrics))
+  except Exception as e:
+    queue.put(('%s%s failed: %r' % (func.__name__,args,e),None))
+
+def codecs():
+
+  found = []
+  if compress:
+    found.append(('compress',compress.compress,compress.decompress))
+  if huffman:
+    found.append(('huffman',huffman.huff,huffman.dehuff))
+  if lzhuff:
+    found.append(('lzhuff',lzhuff.lzhuff,lzhuff.unlzhuff))
+  return found
+
+# one checked round trip, then the best of REPEAT timed runs each way, so one
+# slow run can't trip the regression check
+def codec_case(encode,decode,kind,size):
+
+  s = corpus(size,kind=kind)
+  coded = encode(s)
+  if decode(coded)!=s:
+    raise RuntimeError('round trip failed')
+  c = best(lambda:encode(s))
+  d = best(lambda:decode(coded))
+  return {'ratio':float(len(coded))/len(s),'c_mbps':size/c/1e6,'d_mbps':size/d/1e6}
+
+def fraction_case(n):
+
+  r = random.Random(0)
+  Fraction = fraction.Fraction
+  pairs = [(Fraction(r.randint(-999,999),r.randint(1,999)),
+      Fraction(r.randint(1,999),r.randint(1,999))) for _ in range(n)]
+  ops = {
+    'add' : lambda a,b:a+b,
+    'mul' : lambda a,b:a*b,
+    'div' : lambda a,b:a/b,
+    'lt' : lambda a,b:a<b,
+    'parse' : lambda a,b:Fraction.parse('%s.%s' % (a.n,b.d)),
+  }
+  metrics = {}
+  for (name,op) in ops.items():
+    metrics[name+'_ops'] = n/best(lambda:[op(a,b) for (a,b) in pairs])
+  return metrics
+
+def pi_case(n):
+
+  return {'samples_per_sec':n/best(lambda:monte_carlo_pi.sample(n,monte_carlo_pi.generator(0)))}
+
+# the fastest of a few runs, which is far steadier than a single one
+def best(func,repeat=REPEAT):
+
+  times = []
+  for _ in range(repeat):
+    tic = time.time()
+    func()
+    times.append(time.time()-tic)
+  return min(times)
+
+def bench_suite(sizes,json_path=None,baseline=None,threshold=THRESHOLD):
+
+  results = {}
+
+  if codecs():
+    print('%-28s %8s %10s %10s %10s' % ('case','ratio','c MB/s','d MB/s','peak MB'))
+  for size in sizes:
+    for kind in SUITE_KINDS:
+      for (name,encode,decode) in codecs():
+        key = '%s/%s/%s' % (name,kind,size)
+        m = results[key] = run_case(codec_case,encode,decode,kind,size)
+        print('%-28s %7.1f%% %10.3f %10.3f %10.1f' % (key,100*m['ratio'],
+            m['c_mbps'],m['d_mbps'],m['peak_mb']))
+
+  if fraction:
+    m = results['fraction'] = run_case(fraction_case,FRACTION_OPS)
+    print('%-28s %s' % ('fraction',' '.join(['%s=%.0f/s' % (k[:-4],v)
+        for (k,v) in sorted(m.items()) if k.endswith('_ops')])))
+  if monte_carlo_pi:
+    m = results['monte_carlo_pi'] = run_case(pi_case,PI_SAMPLES)
+    print('%-28s %.0f samples/s' % ('monte_carlo_pi',m['samples_per_sec']))
+
+  if json_path:
+    with open(json_path,'w') as f:
+      json.dump({'python':platform.python_version(),'time':time.time(),
+          'results':results},f,indent=2,sort_keys=True)
+
+  if baseline:
+    with open(baseline) as f:
+      old = json.load(f)['results']
+    failed = regressions(old,results,threshold)
+    for (key,metric,before,after) in failed:
+      print('REGRESSION %s %s: %.4g -> %.4g' % (key,metric,before,after))
+    if failed:
+      sys.exit(1)
+    print('No regressions beyond %d%% against %s' % (100*threshold,baseline))
+
+# every (case,metric,old,new) that got worse by more than threshold, for the
+# cases and metrics that both runs have
+def regressions(old,new,threshold=THRESHOLD):
+
+  failed = []
+  for key in sorted(set(old)&set(new)):
+    for metric in sorted(set(old[key])&set(new[key])):
+      (before,after) = (old[key][metric],new[key][metric])
+      if metric in LOWER_IS_BETTER:
+        if metric=='peak_mb' and after<MEMORY_FLOOR:
+          continue
+        worse = after>before*(1+threshold)
+      else:
+        worse = after<before*(1-threshold)
+      if worse:
+        failed.append((key,metric,before,after))
+  return failed
+
+def bench_pi(sizes):
+
+  print('%12s %12s %12s %12s %8s' % ('samples','estimate','new sec','old sec','speedup'))
+  for n in sizes:
+    tic = time.time()
+    hits = monte_carlo_pi.sample(n,monte_carlo_pi.generator(0))
+    new = time.time()-tic
+    if n<=PI_REFERENCE_LIMIT:
+      tic = time.time()
+      reference_pi(n)
+      old = time.time()-tic
+      print('%12s %12.8f %12.3f %12.3f %7.1fx' % (n,4.0*hits/n,new,old,old/new))
+    else:
+      print('%12s %12.8f %12.3f %12s %8s' % (n,4.0*hits/n,new,'-','-'))
+
+def bench_pipool(sizes):
+
+  counts = [1]
+  while counts[-1]*2<=multiprocessing.cpu_count():
+    counts.append(counts[-1]*2)
+
+  print('%12s %8s %14s %10s' % ('samples','workers','samples/s','speedup'))
+  for n in sizes:
+    (base,expected) = (None,None)
+    for workers in counts:
+      tic = time.time()
+      for (_,hits) in monte_carlo_pi.run(0,samples=n,workers=workers):
+        pass
+      t = time.time()-tic
+      if expected not in (None,hits):
+        raise RuntimeError('%s workers got %s hits instead of %s' % (workers,hits,expected))
+      (base,expected) = (base or t,hits)
+      print('%12s %8s %14.0f %9.1fx' % (n,workers,n/t,base/t))
+
+# the root mean square error against the real pi over PI_SEEDS runs, since a
+# single run of any method can land close by luck
+def bench_pimethods(sizes):
+
+  print('%12s %12s %12s %12s' % ('method','samples','rms error','sec'))
+  for method in sorted(monte_carlo_pi.METHODS):
+    for n in sizes:
+      (squares,tic) = (0.0,time.time())
+      for seed in range(PI_SEEDS):
+        for (_,hits) in monte_carlo_pi.run(seed,samples=n,method=method):
+          pass
+        squares += (4.0*hits/n-math.pi)**2
+      t = (time.time()-tic)/PI_SEEDS
+      print('%12s %12s %12.2e %12.3f' % (method,n,math.sqrt(squares/PI_SEEDS),t))
+
+def bench_fraction(sizes):
+
+  ops = [('add',lambda a,b:a+b),('mul',lambda a,b:a*b),('div',lambda a,b:a/b),
+      ('lt',lambda a,b:a<b)]
+  classes = [fraction.Fraction,ReferenceFraction,fractions.Fraction]
+
+  print('%10s %6s %14s %14s %14s %8s %8s' % ('ops','op','fraction/s','old/s',
+      'fractions/s','vs old','vs std'))
+  for n in sizes:
+    r = random.Random(0)
+    nums = [(r.randint(-999,999),r.randint(1,999),r.randint(1,999),r.randint(1,999))
+        for _ in range(n)]
+    for (name,op) in ops:
+      rates = []
+      for cls in classes:
+        pairs = [(cls(a,b),cls(c,d)) for (a,b,c,d) in nums]
+        rates.append(n/best(lambda:[op(a,b) for (a,b) in pairs]))
+      print('%10s %6s %14.0f %14.0f %14.0f %7.1fx %7.1fx' % (n,name,rates[0],
+          rates[1],rates[2],rates[0]/rates[1],rates[0]/rates[2]))
+
+  # running sums and products whose denominators grow to thousands of digits,
+  # with LazyFraction only reducing once at the end
+  print()
+  print('%10s %6s %14s %14s %14s %14s %8s %8s %8s' % ('terms','chain','fraction sec',
+      'old sec','fractions sec','lazy sec','vs old','vs std','lazy'))
+  chains = [('sum',lambda x,k:x+k),('prod',lambda x,k:x*k)]
+  for (name,op) in chains:
+    times = []
+    for cls in classes+[fraction.LazyFraction]:
+      terms = [cls(k+1,k*k+2) for k in range(FRACTION_CHAIN)]
+      if cls is fraction.LazyFraction:
+        times.append(best(lambda:functools.reduce(op,terms).normalize(),1))
+      else:
+        times.append(best(lambda:functools.reduce(op,terms),1))
+    print('%10s %6s %14.3f %14.3f %14.3f %14.3f %7.1fx %7.1fx %7.1fx' % (FRACTION_CHAIN,
+        name,times[0],times[1],times[2],times[3],times[1]/times[0],times[2]/times[0],
+        times[0]/times[3]))
+
+  # the same work on a FractionArray against a list of Fraction objects. The
+  # elementwise results stay in the array unreduced, as they would in a chain.
+  print()
+  print('%10s %6s %14s %14s %14s %8s %8s' % ('values','op','array sec',
+      'list sec','fractions sec','vs list','vs std'))
+  r = random.Random(0)
+  nums = [(r.randint(-999,999),r.randint(1,999)) for _ in range(2*n)]
+  (xs,ys) = ([fraction.Fraction(*x) for x in nums[:n]],[fraction.Fraction(*x) for x in nums[n:]])
+  (a,b) = (fraction.FractionArray(xs),fraction.FractionArray(ys))
+  (sx,sy) = ([fractions.Fraction(*x) for x in nums[:n]],[fractions.Fraction(*x) for x in nums[n:]])
+  cases = [
+    ('add',lambda:a+b,lambda:[x+y for (x,y) in zip(xs,ys)],
+        lambda:[x+y for (x,y) in zip(sx,sy)]),
+    ('mul',lambda:a*b,lambda:[x*y for (x,y) in zip(xs,ys)],
+        lambda:[x*y for (x,y) in zip(sx,sy)]),
+    ('sum',a.sum,lambda:sum(xs,fraction.Fraction(0)),lambda:sum(sx,fractions.Fraction(0))),
+    ('dot',lambda:a.dot(b),lambda:sum([x*y for (x,y) in zip(xs,ys)],fraction.Fraction(0)),
+        lambda:sum([x*y for (x,y) in zip(sx,sy)],fractions.Fraction(0))),
+    ('chain',lambda:((a+b)*b-a).to_list(),lambda:[(x+y)*y-x for (x,y) in zip(xs,ys)],
+        lambda:[(x+y)*y-x for (x,y) in zip(sx,sy)]),
+  ]
+  for (name,*funcs) in cases:
+    times = [best(f,1) for f in funcs]
+    print('%10s %6s %14.3f %14.3f %14.3f %7.1fx %7.1fx' % (n,name,times[0],
+        times[1],times[2],times[1]/times[0],times[2]/times[0]))
+
+  # adding the same few price strings and rates over and over, with and
+  # without the parse cache
+  print()
+  print('%10s %6s %14s %14s %14s %8s %8s %8s' % ('values','parse','cached sec',
+      'uncached sec','fractions sec','vs off','vs std','hits'))
+  prices = ['%d.%02d' % (r.randint(0,99),r.randint(0,99)) for _ in range(PARSE_DISTINCT)]
+  cases = [
+    ('str',[r.choice(prices) for _ in range(n)]),
+    ('float',[float(r.choice(prices)) for _ in range(n)]),
+  ]
+  for (name,values) in cases:
+    times = []
+    for size in (fraction.PARSE_CACHE_SIZE,0):
+      fraction.set_parse_cache_size(size)
+      times.append(best(lambda:[xs[0]+v for v in values]))
+      if size:
+        stats = fraction.parse_cache_stats()
+    times.append(best(lambda:[sx[0]+fractions.Fraction(v) for v in values]))
+    print('%10s %6s %14.3f %14.3f %14.3f %7.1fx %7.1fx %7.1f%%' % (n,name,times[0],
+        times[1],times[2],times[1]/times[0],times[2]/times[0],100*stats['hit_rate']))
+  fraction.set_parse_cache_size(fraction.PARSE_CACHE_SIZE)
+
+BENCHMARKS = {
+  'words' : (bench_words,SIZES),
+  'decompress' : (bench_decompress,SIZES),
+  'formats' : (bench_formats,SIZES),
+  'blocks' : (bench_blocks,SIZES),
+  'stream' : (bench_stream,STREAM_SIZES),
+  'dehuff' : (bench_dehuff,SIZES),
+  'lzhuff' : (bench_lzhuff,SIZES[:2]),
+  'pi' : (bench_pi,PI_SIZES),
+  'pipool' : (bench_pipool,PI_SIZES[1:]),
+  'pimethods' : (bench_pimethods,PI_METHOD_SIZES),
+  'fraction' : (bench_fraction,[FRACTION_OPS]),
+  'suite' : (bench_suite,SUITE_SIZES),
+}
+
+if __name__=='__main__':
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument('name',nargs='?',default='words',choices=sorted(BENCHMARKS))
+  parser.add_argument('sizes',nargs='*',type=int)
+  parser.add_argument('--json',help='write suite results here')
+  parser.add_argument('--baseline',help='suite results to compare against')
+  parser.add_argument('--threshold',type=float,default=THRESHOLD,
+      help='allowed fraction a metric may get worse by (default %(default)s)')
+  args = parser.parse_args()
+
+  (func,sizes) = BENCHMARKS[args.name]
+  if args.name=='suite':
+    func(args.sizes or sizes,args.json,args.baseline,args.threshold)
+  else:
+    func(args.sizes or sizes)
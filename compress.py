@@ -1,218 +1,632 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
-import sys,time,bisect
-from collections import OrderedDict
+import sys,time,math,bisect,struct,itertools
+from array import array
+
+import container
+from container import pool_map,open_file
+from instrument import QUIET,ConsoleHooks
 
 #~ BLACKLIST = []
-BLACKLIST = ['\n',' ']
+BLACKLIST = [b'\n',b' ']
 MIN_WORD = 6
 MAX_WORD_BITS = 4
 MIN_COUNT = 2
 VERBOSE = False
 DEBUG = False
-DEFAULT_ESCAPE = '\\'
+DEFAULT_ESCAPE = b'\\'
 
 MAX_WORD = 2**MAX_WORD_BITS
 MAX_REL_BITS = 16-MAX_WORD_BITS
 MAX_REL = 2**MAX_REL_BITS
 
-def compress(instr):
+HASH_BITS = 22
+# the most matches that may start at any one position, best scoring first, so
+# that the candidates stay within a few times the input size
+MAX_CANDIDATES = 8
 
-  escape = DEFAULT_ESCAPE
-  count = instr.count(escape)
-  for i in range(0,256):
-    if count==0:
-      break
-    c = chr(i)
-    found = instr.count(c)
-    if found<count:
-      escape = c
-      count = found
+BLOCK_SIZE = 256*1024
+BLOCK_MAGIC = b'\x00'*4
+BLOCK_HEADER = struct.Struct('>II')
+INDEX = container.SeekIndex(b'LZIX',struct.Struct('>QQII'),
+    BLOCK_MAGIC,BLOCK_HEADER)
 
-  print 'Chose escape %s (found %s times)' % (hex(ord(escape)),count)
+# hooks is an instrument.Hooks that gets told about every phase
+def compress(instr,rel_bits=MAX_REL_BITS,word_bits=MAX_WORD_BITS,hooks=None):
 
-  s = instr.replace(escape,'')
+  hooks = hooks or QUIET
+  fmt = TokenFormat(rel_bits,word_bits)
 
-  tic = time.time()
-  replace = OrderedDict()
-  i = 0
-  done = len(s)-(MIN_COUNT+1)*MIN_WORD
-  while i<done:
-    sys.stdout.write('Building dictionary... %.2f%%\r' % (100.0*i/done))
-    for l in range(MAX_WORD+MIN_WORD-1,MIN_WORD-1,-1):
-      word = s[i:i+l]
-      skip = False
-      for x in BLACKLIST:
-        if x in word:
-          skip = True
-          break
-      if skip:
-        continue
-      if word in replace:
-        #i += len(word)-1
+  with hooks.phase('compress',len(instr)) as phase:
+    escape = DEFAULT_ESCAPE
+    count = instr.count(escape)
+    for i in range(0,256):
+      if count==0:
         break
-      replace[word] = s.count(word)
-      #~ if replace[word]>MIN_COUNT:
-        #~ i += len(word)-1
-        #~ break
-    i += 1
-  print 'Building dictionary... 100.00%'
+      c = bytes([i])
+      found = instr.count(c)
+      if found<count:
+        escape = c
+        count = found
 
-  print 'Search took %s sec' % (time.time()-tic)
-  print 'Dictionary has %s words (file was %s characters)' % (len(replace),len(s))
+    s = instr.replace(escape,b'')
 
-  tic = time.time()
-  replace = [(k,v) for (k,v) in replace.items() if v>MIN_COUNT]
-  replace = sorted(replace,key=lambda a:a[1]*(len(a[0])-3),reverse=True)
+    plan = find_matches(s,fmt,hooks).replacements()
+    with hooks.phase('write',len(plan)):
+      out = write_replacements(s,escape,plan,fmt)
 
-  print 'Found %s words that appeared at least %s times' % (len(replace),MIN_COUNT+1)
-  print 'Sorting took %s sec' % (time.time()-tic)
-  if VERBOSE:
-    print '\n'.join(['%5s "%s"' % (v,k.replace('\n','\\n')) for (k,v) in replace[:10]])
+    phase.stats.update(escape=hex(escape[0]),dropped=count,
+        bytes_in=len(instr),bytes_out=len(out))
 
-  tic = time.time()
-  index = []
-  for (i,(word,_)) in enumerate(replace):
-    sys.stdout.write('Indexing... %.2f%%\r' % (100.0*i/len(replace)))
-    matches = get_matches(s,word)
-    for match in matches:
-      index.append((word,match))
-  print 'Indexing... 100.00%'
-  print 'Sorting...'
-  index = sorted(index,key=lambda a:a[1]-len(a[0])/2.0/MAX_WORD)
-  print 'Indexing took %s sec' % (time.time()-tic)
+  return out
+
+# The match stage of compress(): returns a Document holding the matches to
+# replace
+def find_matches(s,fmt,hooks):
+
+  with hooks.phase('dictionary',len(s)) as phase:
+    # long words would otherwise flood the dictionary with every prefix of
+    # every long repeat
+    words = WordIndex(s,len(s)-(MIN_COUNT+1)*MIN_WORD,
+        max_word=fmt.max_word+MIN_WORD-1,maximal=fmt.max_word>MAX_WORD,
+        max_candidates=MAX_CANDIDATES)
+    phase.stats.update(bytes=len(s),words=len(words))
+
+  with hooks.phase('sort') as phase:
+    replace = [(k,v) for (k,v) in words.items() if v>MIN_COUNT]
+    replace = sorted(replace,key=lambda a:a[1]*(len(a[0])-fmt.cost),reverse=True)
+    phase.stats['candidates'] = len(replace)
 
   if VERBOSE:
-    print '\n'.join(['%5s %s' % (i,word.replace('\n','\\n')) for (word,i) in index[:10]])
+    print('\n'.join(['%5s %r' % (v,k) for (k,v) in replace[:10]]))
+
+  with hooks.phase('index',2*len(replace)) as phase:
+    # Each position keeps the MAX_CANDIDATES best scoring words that start
+    # there, so the index stays a few times the size of s. cutoff is the rank
+    # of the last word a full position took.
+    taken = array('B',[0])*len(s)
+    cutoff = array('i',[len(replace)])*len(s)
+    for (r,(word,_)) in enumerate(replace):
+      if r>=phase.next:
+        phase.update(r)
+      for match in words.matches(word):
+        if taken[match]<MAX_CANDIDATES:
+          taken[match] += 1
+          if taken[match]==MAX_CANDIDATES:
+            cutoff[match] = r
+
+    # a counting sort by position and then longest first, the order
+    # plan_replacements() wants, into one flat array of ranks
+    ends = array('i',[0])*(len(s)+1)
+    for i in range(len(s)):
+      ends[i+1] = ends[i]+taken[i]
+    ranks = array('i',[0])*ends[-1]
+    longest = sorted(range(len(replace)),key=lambda r:len(replace[r][0]),reverse=True)
+    for (j,r) in enumerate(longest):
+      if len(replace)+j>=phase.next:
+        phase.update(len(replace)+j)
+      for match in words.matches(replace[r][0]):
+        if r<=cutoff[match]:
+          ranks[ends[match]] = r
+          ends[match] += 1
+    phase.stats['matches'] = len(ranks)
+
+  def index():
+    for i in range(len(s)):
+      for j in range(ends[i]-taken[i],ends[i]):
+        yield (replace[ranks[j]][0],i)
 
-  tic = time.time()
-  replaced = 0
-  offset = 0
-  first = {}
-  last = -1
-  for (j,(word,i)) in enumerate(index):
+  if VERBOSE:
+    print('\n'.join(['%5s %r' % (i,word) for (word,i) in itertools.islice(index(),10)]))
 
-    sys.stdout.write('Replacing... %.2f%%\r' % (100.0*j/len(index)))
+  return plan_replacements(index(),len(s),fmt,hooks,len(ranks))
 
-    if i<last:
-      continue
+# Picks the matches to replace, all in coordinates of the uncompressed string,
+# and returns them in a Document. Its replacements() are (i,length,rel) where
+# rel is the distance in the output from the escape back to the first copy of
+# the word, which Document keeps as plain text so the decoder can copy it.
+def plan_replacements(index,size,fmt=None,hooks=None,count=None):
 
-    i -= offset
-    length = len(word)
+  fmt = fmt or FORMAT
+  doc = Document(size,fmt.cost)
+  first = {}
+  count = len(index) if count is None else count
+  with (hooks or QUIET).phase('replace',count) as phase:
+    for (j,(word,i)) in enumerate(index):
+
+      if j>=phase.next:
+        phase.update(j)
+
+      length = len(word)
+      if not doc.is_plain(i,length):
+        continue
 
-    f = first.get(word,None)
-    if f is None:
-      if s[i:i+length]==word:
+      f = first.get(word,None)
+      if (f is None or not doc.is_plain(f,length)
+          or doc.position(i)-doc.position(f)>fmt.max_rel-1):
         first[word] = i
-      continue
+        continue
 
-    # TODO: figure out why this check is necessary
-    original = s[f:f+length]
-    if original!=word or original!=s[i:i+length]:
-      continue
+      match = Match(f,length,i)
+      if doc.add_match(match) and DEBUG:
+        print('word  = %r' % word)
+        print(match)
 
-    rel = i-f
-    if rel>MAX_REL-1:
-      first[word] = i
-      continue
+    phase.stats['replaced'] = len(doc.matches)
 
-    if DEBUG:
-      print 'first = "%s"' % s[f:f+length].replace('\n','\\n')
-      print 'word  = "%s"' % word.replace('\n','\\n')
-      print ('%s = %s' % ((f,f+length),(i,i+length)))
-      print s[f:f+length].replace('\n','\\n')
-      print s[i:i+length].replace('\n','\\n')
-    s = s[:i]+escape+encode(rel,length)+s[i+length:]
-    if DEBUG:
-      print '-'*20
-      print s
-      print '='*40
-    last = i+length
-    offset += (length-3)
-    replaced += 1
-
-  print 'Replacing... 100.00%'
-  print 'Replaced %s words in %s sec' % (replaced,time.time()-tic)
-
-  return escape+s
-
-def decompress(outstr):
-
-  escape = outstr[0]
-  s = outstr[1:]
-
-  i = len(s)-2
-  while i>=0:
-    if s[i]==escape:
-      (rel,length) = decode(s[i+1:i+3])
-      s = s[:i]+s[i-rel:i-rel+length]+s[i+3:]
-      if DEBUG:
-        print ('%s:%s = "%s"'
-            % (i-rel,i-rel+length,s[i-rel:i-rel+length].replace('\n','\\n')))
-        print '-'*20
-        print s
-        print '='*40
-    i -= 1
+  return doc
 
-  return s
+# Emits the whole output in one pass, copying the text between replacements
+def write_replacements(s,escape,plan,fmt=None):
+
+  fmt = fmt or FORMAT
+  view = memoryview(s)
+  out = bytearray(escape+fmt.header(escape))
+  pos = 0
+  for (i,length,rel) in plan:
+    out += view[pos:i]
+    out += escape+fmt.encode(rel,length)
+    pos = i+length
+  out += view[pos:]
+  return bytes(out)
 
-def get_matches(s,word):
+def decompress(outstr,workers=1,hooks=None):
 
-  matches = []
-  i = 0
-  while i<len(s)-len(word):
-    if s[i:i+len(word)]==word:
-      matches.append(i)
-      i += len(word)
+  with (hooks or QUIET).phase('decompress',len(outstr)) as phase:
+    if outstr.startswith(BLOCK_MAGIC):
+      s = decompress_blocks(outstr,workers)
     else:
-      i += 1
-  return matches
+      s = decode_tokens(outstr,phase)
+    phase.stats.update(bytes_in=len(outstr),bytes_out=len(s))
+  return s
+
+# references always point at plain text earlier in the compressed string, so
+# they can be copied straight from the input while reading it forwards
+def decode_tokens(outstr,phase):
+
+  escape = outstr[:1]
+  (fmt,pos) = TokenFormat.parse(outstr)
+  size = fmt.size
+  view = memoryview(outstr)
+  out = bytearray()
+  while True:
+    i = outstr.find(escape,pos)
+    if i==-1:
+      out += view[pos:]
+      break
+    if i>=phase.next:
+      phase.update(i)
+    out += view[pos:i]
+    (rel,length) = fmt.decode(outstr[i+1:i+1+size])
+    out += view[i-rel:i-rel+length]
+    if DEBUG:
+      print('%s:%s = %r' % (i-rel,i-rel+length,outstr[i-rel:i-rel+length]))
+    pos = i+1+size
+
+  return bytes(out)
+
+# Block mode compresses independent chunks of the input, each one a complete
+# archive of its own, and frames them as BLOCK_MAGIC followed by a
+# (compressed length,original length) header before every block. The magic
+# reads as an escape repeated with 0/0 token widths, which compress() never
+# writes, so decompress() can tell the two apart.
+def compress_blocks(instr,block_size=BLOCK_SIZE,workers=1,
+    rel_bits=MAX_REL_BITS,word_bits=MAX_WORD_BITS):
+
+  jobs = [(instr[i:i+block_size],rel_bits,word_bits)
+      for i in range(0,len(instr),block_size)]
+
+  out = bytearray(BLOCK_MAGIC)
+  for (original,archive) in pool_map(compress_block,jobs,workers):
+    out += BLOCK_HEADER.pack(len(archive),original)
+    out += archive
+  return bytes(out)
+
+def decompress_blocks(outstr,workers=1):
+
+  blocks = [archive for (archive,_,_) in read_blocks(outstr)]
+  return b''.join(pool_map(decompress,blocks,workers))
+
+# yields (archive,offset,original length) for every block
+def read_blocks(outstr):
+
+  pos = len(BLOCK_MAGIC)
+  while pos<len(outstr):
+    (length,original) = BLOCK_HEADER.unpack_from(outstr,pos)
+    pos += BLOCK_HEADER.size
+    yield (outstr[pos:pos+length],pos,original)
+    pos += length
+
+# Streaming versions of compress_blocks() and decompress(). One pool serves
+# the whole stream and only about 2*workers blocks are held at once, so memory
+# doesn't grow with the input. Both return (bytes read,bytes written).
+def compress_stream(in_fp,out_fp,block_size=BLOCK_SIZE,workers=1,
+    rel_bits=MAX_REL_BITS,word_bits=MAX_WORD_BITS):
+
+  out_fp.write(BLOCK_MAGIC)
+  (inlen,outlen) = (0,len(BLOCK_MAGIC))
+  jobs = ((block,rel_bits,word_bits)
+      for block in iter(lambda:in_fp.read(block_size),b''))
+  for (original,archive) in container.pool_imap(compress_block,jobs,workers):
+    out_fp.write(BLOCK_HEADER.pack(len(archive),original))
+    out_fp.write(archive)
+    inlen += original
+    outlen += BLOCK_HEADER.size+len(archive)
+  return (inlen,outlen)
+
+def decompress_stream(in_fp,out_fp,workers=1):
+
+  # a single archive can refer back to anything before it, so only block
+  # archives can be decoded a piece at a time
+  magic = in_fp.read(len(BLOCK_MAGIC))
+  if magic!=BLOCK_MAGIC:
+    outstr = magic+in_fp.read()
+    s = decompress(outstr)
+    out_fp.write(s)
+    return (len(outstr),len(s))
+
+  (inlen,outlen) = (len(magic),0)
+  for (length,s) in container.pool_imap(decompress_block,read_archives(in_fp),workers):
+    out_fp.write(s)
+    inlen += BLOCK_HEADER.size+length
+    outlen += len(s)
+  return (inlen,outlen)
+
+# yields the archive of every block left in a block archive file
+def read_archives(fp):
+
+  while True:
+    header = fp.read(BLOCK_HEADER.size)
+    if not header:
+      break
+    (length,_) = BLOCK_HEADER.unpack(header)
+    yield fp.read(length)
+
+# the pool jobs return lengths instead of sending the input back
+def compress_block(job):
+
+  return (len(job[0]),compress(*job))
+
+def decompress_block(archive):
+
+  return (len(archive),decompress(archive))
+
+# Decodes only the blocks that overlap start:start+length, using the index
+# that INDEX.write() saved if there is one. Single archives have no blocks, so
+# those still have to be decoded whole.
+def read_range(path,start,length,index_path=None):
+
+  index = INDEX.load(path,index_path)
+  if index is None:
+    with open(path,'rb') as f:
+      return decompress(f.read())[start:start+length]
+  if not index:
+    return b''
+
+  (blocks,skip) = container.overlapping(index,start,length)
+  out = []
+  with open(path,'rb') as f:
+    for (_,pos,size,_) in blocks:
+      f.seek(pos)
+      out.append(decompress(f.read(size)))
+  return b''.join(out)[skip:skip+length]
+
+# Finds every word that the dictionary loop used to find with s.count(), but
+# groups the positions of each word instead of rescanning the whole string. A
+# group of positions is only split on the next character while it still has at
+# least MIN_COUNT+1 positions, and runs of characters that every position has
+# in common are skipped in one step, so the work stays close to linear no
+# matter how many words there are.
+#
+# With maximal=True a word is left out when every one of its positions can be
+# extended to the same longer word, since the longer one always scores better.
+# max_candidates then also caps how many of the lengths along one chain of
+# groups become words, keeping the ones that cover the most characters, so a
+# long repeat doesn't add a word for every length up to max_word.
+class WordIndex(object):
+
+  def __init__(self,s,limit=None,min_word=MIN_WORD,
+      max_word=MAX_WORD+MIN_WORD-1,min_count=MIN_COUNT,blacklist=BLACKLIST,
+      maximal=False,max_candidates=None):
+
+    self.s = s
+    self.limit = len(s) if limit is None else limit
+    self.min_word = min_word
+    self.max_word = max_word
+    self.min_count = min_count
+    self.blacklist = blacklist
+    self.maximal = maximal
+    self.max_candidates = max_candidates
+
+    self.words = []
+    self.positions = {}
+    if len(s)>=min_word and self.limit>0:
+      self.build()
+
+  def build(self):
+
+    s = self.s
+    n = len(s)
+    stop = self.stops()
+    need = self.min_count+1
+
+    # cheap first pass: count word hashes so that words occurring only once or
+    # twice never make it into the (much larger) dict of positions
+    mask = 2**min(HASH_BITS,n.bit_length())-1
+    buckets = array('i',[0])*(mask+1)
+    l = self.min_word
+    for i in range(n-l+1):
+      if i+l<stop[i]:
+        buckets[hash(s[i:i+l])&mask] += 1
+
+    groups = {}
+    for i in range(min(n-l+1,self.limit)):
+      if i+l<stop[i]:
+        word = s[i:i+l]
+        if buckets[hash(word)&mask]>=need:
+          if word in groups:
+            groups[word].append(i)
+          else:
+            groups[word] = array('i',[i])
+
+    # only words that start before the limit become dictionary entries, but
+    # their later repeats still count, so add those to the surviving groups
+    if self.limit<n-l+1:
+      for i in range(self.limit,n-l+1):
+        if i+l<stop[i]:
+          word = s[i:i+l]
+          if word in groups:
+            groups[word].append(i)
+
+    # Every group is handled along with the chain of smaller groups that keep
+    # following its first position: the positions that share at least k more
+    # characters with the first one, for every k where one of them drops out.
+    # Positions that drop out and could go on start new groups of their own.
+    groups = [(len(w),p) for (w,p) in groups.items() if len(p)>=need]
+    while groups:
+      (l,positions) = groups.pop()
+      first = positions[0]
+      extents = self.extents(positions,l,stop)
+
+      # the chain stops at the first k whose group is too small
+      counts = {}
+      for k in extents:
+        counts[k] = counts.get(k,0)+1
+      chain = []
+      left = len(positions)
+      for k in sorted(counts):
+        if left<need:
+          break
+        chain.append((k,left))
+        left -= counts[k]
+
+      if not self.maximal:
+        lengths = []
+        last = -1
+        for (k,_) in chain:
+          lengths.append((k,range(last+1,k+1)))
+          last = k
+      else:
+        if self.max_candidates and len(chain)>self.max_candidates:
+          # the best scoring length of every quarter power of two, so that
+          # shorter words are still there to fill in around the longest ones
+          best = {}
+          for (k,size) in chain:
+            bucket = int(math.log2(l+k)*4)
+            if bucket not in best or size*(l+k)>=best[bucket][1]*(l+best[bucket][0]):
+              best[bucket] = (k,size)
+          chain = sorted(best.values(),key=lambda a:a[1]*(l+a[0]),reverse=True)
+          chain = sorted(chain[:self.max_candidates])
+        lengths = [(k,(k,)) for (k,_) in chain]
+      for (k,extra) in lengths:
+        group = array('i',[p for (p,e) in zip(positions,extents) if e>=k])
+        for j in extra:
+          self.add(s[first:first+l+j],group)
+
+      last = chain[-1][0] if chain else -1
+      children = {}
+      for (p,e) in zip(positions,extents):
+        if e<=last and l+e<self.max_word and p+l+e+1<stop[p]:
+          key = (e,s[p+l+e])
+          if key in children:
+            children[key].append(p)
+          else:
+            children[key] = array('i',[p])
+      for ((e,_),p) in children.items():
+        if len(p)>=need and p[0]<self.limit:
+          groups.append((l+e+1,p))
+
+    self.words.sort()
+
+  # how many more characters each position has in common with the first one
+  def extents(self,positions,l,stop):
+
+    s = self.s
+    first = positions[0]
+    top = min(self.max_word-l,stop[first]-first-l-1)
+    ref = s[first+l:first+l+top]
+    extents = array('i')
+    for p in positions:
+      longest = min(top,stop[p]-p-l-1)
+      if s[p+l:p+l+longest]==ref[:longest]:
+        extents.append(longest)
+        continue
+      (lo,hi) = (0,longest-1)
+      while lo<hi:
+        mid = (lo+hi+1)//2
+        if s[p+l:p+l+mid]==ref[:mid]:
+          lo = mid
+        else:
+          hi = mid-1
+      extents.append(lo)
+    return extents
+
+  def stops(self):
+
+    # stop[i] is the end of the first blacklisted string starting at or after i,
+    # so s[i:i+l] is allowed exactly when i+l<stop[i]
+    n = len(self.s)
+    found = []
+    for x in self.blacklist:
+      i = self.s.find(x)
+      while i!=-1:
+        found.append((i,i+len(x)))
+        i = self.s.find(x,i+1)
+    found.sort()
+
+    stop = array('i',[0])*n
+    cur = n+1
+    hi = n
+    for (start,end) in reversed(found):
+      stop[start+1:hi] = array('i',[cur])*(hi-start-1)
+      cur = min(cur,end)
+      hi = start+1
+    stop[0:hi] = array('i',[cur])*hi
+    return stop
+
+  def add(self,word,positions):
+
+    # same non-overlapping scan as str.count()
+    l = len(word)
+    matches = array('i')
+    end = 0
+    for p in positions:
+      if p>=end:
+        matches.append(p)
+        end = p+l
+    if len(matches)<=self.min_count:
+      return
+    self.words.append((positions[0],-l,word,len(matches)))
+    if matches[-1]==len(self.s)-l:
+      matches.pop()
+    self.positions[word] = matches
+
+  def items(self):
+
+    return [(word,count) for (_,_,word,count) in self.words]
+
+  def matches(self,word):
+
+    return list(self.positions[word])
+
+  def __len__(self):
+
+    return len(self.words)
+
+# A token is the escape followed by rel and length-MIN_WORD packed into as few
+# bytes as fit rel_bits+word_bits. The default 12/4 split is the original
+# format with no header. Any other split writes the escape twice and then the
+# two widths; that can't be mistaken for the original format because a token
+# can never be the first thing in the output.
+class TokenFormat(object):
+
+  def __init__(self,rel_bits=MAX_REL_BITS,word_bits=MAX_WORD_BITS):
+
+    if not 0<rel_bits<256 or not 0<word_bits<256:
+      raise ValueError('invalid token format %s/%s' % (rel_bits,word_bits))
+    self.rel_bits = rel_bits
+    self.word_bits = word_bits
+    self.size = (rel_bits+word_bits+7)//8
+    self.cost = self.size+1
+    self.max_rel = 2**rel_bits
+    self.max_word = 2**word_bits
+
+  @property
+  def legacy(self):
+
+    return (self.rel_bits,self.word_bits)==(MAX_REL_BITS,MAX_WORD_BITS)
+
+  def header(self,escape):
+
+    if self.legacy:
+      return b''
+    return escape+bytes([self.rel_bits,self.word_bits])
+
+  @staticmethod
+  def parse(outstr):
+
+    if len(outstr)>3 and outstr[1]==outstr[0]:
+      return (TokenFormat(outstr[2],outstr[3]),4)
+    return (FORMAT,1)
+
+  def encode(self,rel,length):
 
-def encode(rel,length):
+    if DEBUG:
+      print((rel,length))
+    value = (rel<<self.word_bits)|(length-MIN_WORD)
+    return value.to_bytes(self.size,'big')
+
+  def decode(self,s):
+
+    value = int.from_bytes(s,'big')
+    return (value>>self.word_bits,(value&(self.max_word-1))+MIN_WORD)
+
+  def __str__(self):
 
-  if DEBUG:
-    print (rel,length)
-  rel = bin(rel)[2:].zfill(MAX_REL_BITS)
-  length = bin(length-MIN_WORD)[2:].zfill(MAX_WORD_BITS)
-  full = rel+length
-  if DEBUG:
-    print full
-  return chr(int(full[:8],2))+chr(int(full[8:],2))
+    return '<TokenFormat %s/%s>' % (self.rel_bits,self.word_bits)
 
-def decode(s):
+  __repr__ = __str__
 
-  s = bin(ord(s[0]))[2:].zfill(8)+bin(ord(s[1]))[2:].zfill(8)
-  rel = int(s[:MAX_REL_BITS],2)
-  length = int(s[MAX_REL_BITS:],2)+MIN_WORD
-  return (rel,length)
+FORMAT = TokenFormat()
 
+# The bytes every match saves are kept in a PrefixSums by position, so matches
+# can be added in any order for O(log n) each. The list of matches is only
+# sorted again when it's read after an out of order add.
 class Document(object):
 
-  def __init__(self,length):
+  def __init__(self,length,cost=3):
 
     self.length = length
-    self.matches = []
+    self.cost = cost
+    self._matches = []
+    self.unsorted = False
+    self.saved = PrefixSums(length)
+    self.found = Range(length)
     self.protected = Range(length)
-    self.offset = 0
 
-  def add_match(self,match):
+  @property
+  def matches(self):
 
-    for m in self.matches:
-      if match.intersects(m):
-        return False
+    if self.unsorted:
+      self._matches.sort()
+      self.unsorted = False
+    return self._matches
+
+  def add_match(self,match):
 
-    r = Range(self.length,(match.found_start,match.found_end))
-    if r.intersects(self.protected):
+    (start,end) = (match.found_start,match.found_end)
+    if (self.found.intersects_range(start,end)
+        or self.protected.intersects_range(start,end)
+        or self.found.intersects_range(match.ref_start,match.ref_end)):
       return False
 
-    bisect.insort(self.matches,match)
-    self.protected += Range(self.length,(match.ref_start,match.ref_end))
+    if self._matches and start<self._matches[-1].found_start:
+      self.unsorted = True
+    self._matches.append(match)
+    self.saved.add(start,match.length-self.cost)
+    self.found.add(start,end)
+    self.protected.add(match.ref_start,match.ref_end)
     return True
 
+  def is_plain(self,start,length):
+
+    return not self.found.intersects_range(start,start+length-1)
+
+  # where a plain character of the original ends up in the output
+  def position(self,i):
+
+    return i-self.saved.before(i)
+
+  def replacements(self):
+
+    return [(m.found_start,m.length,self.position(m.found_start)
+        -self.position(m.ref_start)) for m in self.matches]
+
 class Match(object):
 
   def __init__(self,ref,length,found):
 
+    self.length = length
     self.ref_start = ref
     self.ref_end = ref+length-1
     self.found_start = found
@@ -229,7 +643,7 @@ class Match(object):
     if not isinstance(other,Match):
       raise TypeError
     return (
-      self.found_start<other.found_end and self.found_end>other.found_start
+      self.found_start<=other.found_end and self.found_end>=other.found_start
     )
 
   def __str__(self):
@@ -239,34 +653,63 @@ class Match(object):
 
   __repr__ = __str__
 
+# Disjoint inclusive (start,end) ranges, kept sorted so that lookups and
+# inserts only need a bisect instead of a scan over every range
 class Range(object):
 
   def __init__(self,length,start=None):
 
     self.length = length
+    self.starts = []
+    self.ends = []
     if start is None:
-      self.ranges = []
+      pass
     elif isinstance(start,tuple):
-      self.ranges = [start]
+      self.add(*start)
     elif isinstance(start,list):
-      self.ranges = start
+      for (s,e) in start:
+        self.add(s,e)
     else:
       raise TypeError
 
+  @property
+  def ranges(self):
+
+    return list(zip(self.starts,self.ends))
+
+  def add(self,start,end):
+
+    # merge with every range that overlaps start:end
+    right = bisect.bisect_right(self.starts,end)
+    left = bisect.bisect_left(self.ends,start,0,right)
+    if left<right:
+      start = min(start,self.starts[left])
+      end = max(end,self.ends[right-1])
+    self.starts[left:right] = [start]
+    self.ends[left:right] = [end]
+
+  def intersects_range(self,start,end):
+
+    i = bisect.bisect_right(self.starts,end)
+    return i>0 and self.ends[i-1]>=start
+
   def intersects(self,other):
 
     if not isinstance(other,Range):
       raise TypeError
 
-    for (s1,e1) in self.ranges:
-      for (s2,e2) in other.ranges:
-        if s1<e2 and e1>s2:
-          return True
+    if len(other.starts)>len(self.starts):
+      (self,other) = (other,self)
+    for (s,e) in other.ranges:
+      if self.intersects_range(s,e):
+        return True
+    return False
 
   def copy(self):
 
     new = Range(self.length)
-    new.ranges = [x for x in self.ranges]
+    new.starts = self.starts[:]
+    new.ends = self.ends[:]
     return new
 
   def __contains__(self,other):
@@ -274,34 +717,27 @@ class Range(object):
     if not isinstance(other,int):
       raise TypeError
 
-    return self.intersects(Range(self.length,(other,other)))
+    return self.intersects_range(other,other)
 
-  def __add__(self,other):
+  def __iadd__(self,other):
 
     if not isinstance(other,Range):
       return NotImplemented
 
     if self.length!=other.length:
-      return ValueError
+      raise ValueError
 
-    new = self.copy()
+    for (s,e) in other.ranges:
+      self.add(s,e)
+    return self
 
-    for (s2,e2) in other.ranges:
-      right = len(new.ranges)
-      inter = []
-      for (i,(s1,e1)) in enumerate(new.ranges):
-        if e2<s1:
-          right = i
-        if s1<e2 and e1>s2:
-          inter.append(i)
-      if inter:
-        s = min(new.ranges[inter[0]][0],s2)
-        e = max(new.ranges[inter[-1]][1],e2)
-        del new.ranges[inter[0]:inter[-1]+1]
-      else:
-        (s,e) = (s2,e2)
-      new.ranges.insert(right,(s,e))
+  def __add__(self,other):
 
+    if not isinstance(other,Range):
+      return NotImplemented
+
+    new = self.copy()
+    new += other
     return new
 
   def __str__(self):
@@ -311,24 +747,69 @@ class Range(object):
       result[s:e+1] = ['#']*(e-s+1)
     return ''.join(result)
 
+# A Fenwick tree over positions 0..length-1, for adding a value at a position
+# and summing everything before a position in O(log n) each
+class PrefixSums(object):
+
+  def __init__(self,length):
+
+    self.tree = array('i',[0])*(length+1)
+
+  def add(self,i,value):
+
+    tree = self.tree
+    i += 1
+    while i<len(tree):
+      tree[i] += value
+      i += i&-i
+
+  def before(self,i):
+
+    tree = self.tree
+    total = 0
+    while i>0:
+      total += tree[i]
+      i &= i-1
+    return total
+
 if __name__=='__main__':
 
   tic = time.time()
+  # block mode uses every core unless told otherwise
+  workers = int(sys.argv[4]) if len(sys.argv)>4 else None
+
+  if sys.argv[2]=='i':
+    index = INDEX.write(sys.argv[1],sys.argv[3])
+    print('Indexed %s blocks in %s sec' % (len(index),time.time()-tic))
+
+  # the streaming modes also accept - for stdin/stdout, so they report on stderr
+  elif sys.argv[2] in ('sc','sd'):
+    with open_file(sys.argv[1],'rb') as fin:
+      with open_file(sys.argv[3],'wb') as fout:
+        if sys.argv[2]=='sc':
+          (inlen,outlen) = compress_stream(fin,fout,workers=workers or 1)
+        else:
+          (inlen,outlen) = decompress_stream(fin,fout,workers=workers or 1)
+    print('%sompressing took %s sec' % (['Dec','C'][sys.argv[2]=='sc'],time.time()-tic),file=sys.stderr)
+    print('(out %s) / (in %s) = %s%%' % (outlen,inlen,100*outlen//max(inlen,1)),file=sys.stderr)
 
-  with open(sys.argv[1],'rb') as f:
-    s = f.read()
-  inlen = len(s)
-
-  if sys.argv[2]=='c':
-    s = compress(s)
-  elif sys.argv[2]=='d':
-    s = decompress(s)
   else:
-    raise RuntimeError('invalid option "%s"' % sys.argv[2])
-  with open(sys.argv[3],'wb') as f:
-    f.write(s)
-  outlen = len(s)
-
-  print ''
-  print '%sompressing took %s sec' % (['Dec','C'][sys.argv[2]=='c'],time.time()-tic)
-  print '(out %s) / (in %s) = %s%%\n' % (outlen,inlen,100*outlen/inlen)
+    with open(sys.argv[1],'rb') as f:
+      s = f.read()
+    inlen = len(s)
+
+    if sys.argv[2]=='c':
+      s = compress(s,hooks=ConsoleHooks())
+    elif sys.argv[2]=='b':
+      s = compress_blocks(s,workers=workers)
+    elif sys.argv[2]=='d':
+      s = decompress(s,workers,ConsoleHooks())
+    else:
+      raise RuntimeError('invalid option "%s"' % sys.argv[2])
+    with open(sys.argv[3],'wb') as f:
+      f.write(s)
+    outlen = len(s)
+
+    print('')
+    print('%sompressing took %s sec' % (['Dec','C'][sys.argv[2]!='d'],time.time()-tic))
+    print('(out %s) / (in %s) = %s%%\n' % (outlen,inlen,100*outlen//inlen))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+# The parts of a block container that compress.py and huffman.py share:
+# mapping blocks over a process pool, seek indexes kept next to an archive, and
+# opening - as stdin or stdout for the streaming modes.
+
+import sys,os,bisect
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+INDEX_SUFFIX = '.idx'
+
+# workers=None uses one process per core. The codecs default to 1 and leave
+# starting a pool to callers that ask for one, like the command line.
+def pool_map(func,jobs,workers=None):
+
+  workers = min(workers or os.cpu_count(),len(jobs))
+  if workers<=1:
+    return list(map(func,jobs))
+  with ProcessPoolExecutor(workers) as pool:
+    return list(pool.map(func,jobs))
+
+# Yields func(job) for every job in order, taking jobs only as they are
+# needed. One pool runs the whole sequence with at most 2*workers jobs in
+# flight, so reading jobs and using results overlap with the work and memory
+# stays bounded however many jobs there are.
+def pool_imap(func,jobs,workers=None):
+
+  workers = workers or os.cpu_count()
+  if workers<=1:
+    for job in jobs:
+      yield func(job)
+    return
+  with ProcessPoolExecutor(workers) as pool:
+    pending = deque()
+    for job in jobs:
+      pending.append(pool.submit(func,job))
+      if len(pending)>=2*workers:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+
+def open_file(path,mode):
+
+  if path=='-':
+    return os.fdopen(os.dup((sys.stdin if 'r' in mode else sys.stdout).fileno()),mode)
+  return open(path,mode)
+
+# A seek index has one (original offset,archive offset,coded length,original
+# length,...) entry per block, where the rest are the other fields of the
+# block's header. An archive starts with block_magic and every block with a
+# header whose first two fields are its coded and original lengths. The index
+# can always be rebuilt by hopping over the block headers, but write() saves
+# it next to the archive so that a range read doesn't have to visit every
+# header of a large archive.
+class SeekIndex(object):
+
+  def __init__(self,magic,entry,block_magic,header):
+
+    self.magic = magic
+    self.entry = entry
+    self.block_magic = block_magic
+    self.header = header
+
+  # returns None if fp isn't a block archive
+  def build(self,fp):
+
+    fp.seek(0)
+    if fp.read(len(self.block_magic))!=self.block_magic:
+      return None
+
+    header = self.header
+    index = []
+    (start,pos) = (0,len(self.block_magic))
+    while True:
+      fields = fp.read(header.size)
+      if len(fields)<header.size:
+        break
+      fields = header.unpack(fields)
+      (length,original) = fields[:2]
+      pos += header.size
+      index.append((start,pos)+fields)
+      start += original
+      pos += length
+      fp.seek(pos)
+    return index
+
+  def write(self,path,index_path=None):
+
+    with open(path,'rb') as f:
+      index = self.build(f)
+    if index is None:
+      raise ValueError('%s is not a block archive' % path)
+    with open(index_path or path+INDEX_SUFFIX,'wb') as f:
+      f.write(self.magic)
+      for entry in index:
+        f.write(self.entry.pack(*entry))
+    return index
+
+  # a saved index is only used if it's newer than the archive
+  def load(self,path,index_path=None):
+
+    index_path = index_path or path+INDEX_SUFFIX
+    if (os.path.exists(index_path)
+        and os.path.getmtime(index_path)>=os.path.getmtime(path)):
+      with open(index_path,'rb') as f:
+        data = f.read()
+      if data.startswith(self.magic):
+        return [self.entry.unpack_from(data,i)
+            for i in range(len(self.magic),len(data),self.entry.size)]
+    with open(path,'rb') as f:
+      return self.build(f)
+
+# Returns the entries of the blocks that overlap start:start+length and where
+# start is in the first of them
+def overlapping(index,start,length):
+
+  i = max(bisect.bisect_right([entry[0] for entry in index],start)-1,0)
+  entries = []
+  for entry in index[i:]:
+    if entry[0]>=start+length:
+      break
+    entries.append(entry)
+  return (entries,start-index[i][0])
@@ -2,22 +2,36 @@
 #
 # https://docs.python.org/3/reference/datamodel.html#special-method-names
 
-from functools import total_ordering, wraps
+from functools import total_ordering, wraps, lru_cache
+from math import gcd
+
+# FractionArray and LazyFraction leave results unreduced until a denominator
+# gets this long
+REDUCE_BITS = 4096
+# Fraction.parse keeps the results for this many strings and floats, and
+# shares one Fraction for every int from -SMALL_INTS to SMALL_INTS
+PARSE_CACHE_SIZE = 4096
+SMALL_INTS = 256
 
 def with_fractions(*dec_args, **dec_kwargs):
   """Parse args into Fraction objects."""
 
+  int_only = dec_kwargs.get('int_only')
+
   def outer(func):
     @wraps(func)
     def decorate(*args, **kwargs):
+      # a LazyFraction operand is left to its own reflected operator
+      if any(isinstance(x, LazyFraction) for x in args):
+        return NotImplemented
       try:
         args = [Fraction.parse(x) for x in args]
         kwargs = {k:Fraction.parse(v) for (k,v) in kwargs.items()}
       except TypeError:
         return NotImplemented
-      if dec_kwargs.get('int_only'):
-        for x in args + list(kwargs.values()):
-          if x.d != 1:
+      if int_only:
+        for x in (*args, *kwargs.values()):
+          if x._d != 1:
             raise ValueError(
               'cannot call {} with non-int Fractions'.format(func.__name__)
             )
@@ -30,9 +44,59 @@ def with_fractions(*dec_args, **dec_kwargs):
   else:
     return outer
 
+def parse_cache_stats():
+  """Hits, misses, hit rate and size of the Fraction.parse cache."""
+
+  info = _parse_cached.cache_info()
+  calls = info.hits + info.misses
+  return {
+    'hits': info.hits,
+    'misses': info.misses,
+    'hit_rate': info.hits / calls if calls else 0.0,
+    'size': info.currsize,
+    'maxsize': info.maxsize,
+  }
+
+def set_parse_cache_size(size):
+  """Replace the Fraction.parse cache with an empty one of the given size;
+  0 turns caching off and None lets it grow without bound."""
+
+  global _parse_cached
+  _parse_cached = lru_cache(size)(_parse_value)
+
+def _parse_value(x):
+  """Parse a float or a decimal string."""
+
+  if isinstance(x, float):
+    return Fraction(*x.as_integer_ratio())
+  radix = x.find('.')
+  x = x.replace('.', '')
+  if radix == -1:
+    radix = len(x)
+  return Fraction(int(x), 10**(len(x)-radix))
+
+_parse_cached = lru_cache(PARSE_CACHE_SIZE)(_parse_value)
+
+def _operand(x):
+  """Parse the other operand of an operator, or None if it can't be one. A
+  LazyFraction isn't one, so that mixed arithmetic stays lazy."""
+
+  if isinstance(x, LazyFraction):
+    return None
+  try:
+    return Fraction.parse(x)
+  except TypeError:
+    return None
+
 @total_ordering
 class Fraction:
-  """Do math with integer fractions, avoiding floating point."""
+  """Do math with integer fractions, avoiding floating point.
+
+  Fractions are immutable: n and d are read-only, since parse hands out the
+  same cached instance to every caller.
+  """
+
+  __slots__ = ('_n', '_d')
 
   ##### Static methods
 
@@ -40,69 +104,115 @@ class Fraction:
   def parse(x):
     if isinstance(x, Fraction):
       return x
+    elif isinstance(x, LazyFraction):
+      return x.fraction()
     elif isinstance(x, int):
-      return Fraction(x, 1)
-    elif isinstance(x, float):
-      return Fraction(*x.as_integer_ratio())
+      if -SMALL_INTS <= x <= SMALL_INTS:
+        return _small_ints[x + SMALL_INTS]
+      return Fraction._new(int(x), 1)
+    elif isinstance(x, (float, str)):
+      return _parse_cached(x)
     elif isinstance(x, tuple) and 0 < len(x) < 3:
       return Fraction(*x)
-    elif isinstance(x, str):
-      radix = x.find('.')
-      x = x.replace('.', '')
-      if radix == -1:
-        radix = len(x)
-      return Fraction(int(x), 10**(len(x)-radix))
     else:
       raise TypeError
 
   @staticmethod
   def gcd(a, b):
-    while b:
-      (a, b) = (b, a%b)
-    return abs(a)
+    return gcd(a, b)
 
   @staticmethod
   def lcm(a, b):
-    return abs(a*b // Fraction.gcd(a, b))
+    return abs(a*b // gcd(a, b))
 
   @staticmethod
   def simplify(n, d):
-    neg = (-1 if n * d < 0 else 1)
-    (n, d) = map(abs, (n, d))
-    g = Fraction.gcd(n, d)
-    return (neg * n//g, d//g)
+    g = gcd(n, d)
+    if d < 0:
+      g = -g
+    return (n//g, d//g)
+
+  @staticmethod
+  def _new(n, d):
+    """Make n/d without checks, when it's known to be reduced and d > 0."""
+    f = object.__new__(Fraction)
+    f._n = n
+    f._d = d
+    return f
+
+  @staticmethod
+  def _reduce(n, d):
+    """Make n/d in lowest terms, when d > 0 is already known."""
+    g = gcd(n, d)
+    if g != 1:
+      (n, d) = (n//g, d//g)
+    f = object.__new__(Fraction)
+    f._n = n
+    f._d = d
+    return f
+
+  # Henrici's algorithms (Knuth, TAOCP 4.5.1) for reduced operands. They take
+  # gcds of the denominators and the cross terms, which are much smaller than
+  # the unreduced result, so long sums and products never reduce a big one.
+
+  @staticmethod
+  def _add(n1, d1, n2, d2):
+    """Make n1/d1 + n2/d2, for reduced operands with d1, d2 > 0."""
+    g = gcd(d1, d2)
+    if g == 1:
+      return Fraction._new(n1*d2 + n2*d1, d1*d2)
+    s = d1 // g
+    t = n1*(d2 // g) + n2*s
+    g = gcd(t, g)
+    if g == 1:
+      return Fraction._new(t, s*d2)
+    return Fraction._new(t // g, s*(d2 // g))
+
+  @staticmethod
+  def _mul(n1, d1, n2, d2):
+    """Make n1/d1 * n2/d2, for reduced operands with d1, d2 > 0."""
+    g1 = gcd(n1, d2)
+    g2 = gcd(n2, d1)
+    return Fraction._new((n1//g1) * (n2//g2), (d1//g2) * (d2//g1))
 
   ##### Normal methods
 
+  @property
+  def n(self):
+    return self._n
+
+  @property
+  def d(self):
+    return self._d
+
   def __init__(self, n, d=1):
     if d == 0:
       raise ZeroDivisionError
 
+    if isinstance(n, int) and isinstance(d, int):
+      (self._n, self._d) = Fraction.simplify(n, d)
+      return
+
     if not isinstance(n, int):
       n = Fraction.parse(n)
     if not isinstance(d, int):
       d = Fraction.parse(d)
 
-    if any(isinstance(x, Fraction) for x in (n, d)):
-      f = n / d
-      (n, d) = (f.n, f.d)
-    else:
-      (n, d) = Fraction.simplify(n, d)
-
-    (self.n, self.d) = (n, d)
+    f = n / d
+    (self._n, self._d) = (f._n, f._d)
 
   def __repr__(self):
     return '<Fraction {}>'.format(str(self))
 
   def __str__(self):
-    if self.d == 1:
-      return str(self.n)
-    return '{}/{}'.format(self.n, self.d)
+    if self._d == 1:
+      return str(self._n)
+    return '{}/{}'.format(self._n, self._d)
 
   # https://docs.python.org/3/library/string.html#format-specification-mini-language
   def __format__(self, spec):
     if any(spec.endswith(x) for x in 'bcdoxXn'):
-      if self.d != 1:
+      if self._d != 1:
         raise ValueError(
           'Unkown format code "{}" for non-int Fraction'.format(spec)
         )
@@ -112,40 +222,50 @@ class Fraction:
     return str(self).__format__(spec)
 
   def __hash__(self):
-    return hash((self.n, self.d))
+    return hash((self._n, self._d))
 
   def __bool__(self):
-    return self.n != 0
+    return self._n != 0
 
   ##### Numeric methods - unary
 
   def __neg__(self):
-    return Fraction(-self.n, self.d)
+    return Fraction._new(-self._n, self._d)
 
   def __pos__(self):
-    return Fraction(self.n, self.d)
+    return Fraction._new(self._n, self._d)
 
   def __abs__(self):
-    return Fraction(abs(self.n), self.d)
+    return Fraction._new(abs(self._n), self._d)
 
   def __invert__(self):
-    return Fraction(self.d, self.n)
+    if self._n < 0:
+      return Fraction._new(-self._d, -self._n)
+    elif self._n:
+      return Fraction._new(self._d, self._n)
+    raise ZeroDivisionError
 
   def __complex__(self):
     return complex(float(self))
 
   def __int__(self):
-    return (self.n // self.d) + (1 if self.n < 0 else 0)
+    return (self._n // self._d) + (1 if self._n < 0 else 0)
 
   def __float__(self):
-    return self.n / self.d
+    return self._n / self._d
 
   def __index__(self):
-    if self.d != 1:
+    if self._d != 1:
       raise ValueError('non-integer Fraction may not be used here')
-    return self.n
+    return self._n
+
+  def __round__(self, digits=None):
+    if digits is None:
+      (q, r) = divmod(self._n, self._d)
+      if 2*r > self._d or (2*r == self._d and q % 2):
+        q += 1
+      return q
 
-  def __round__(self, digits):
     interval = Fraction(1, 10**digits)
     cutoff = interval / 2
     remainder = self % interval
@@ -158,57 +278,78 @@ class Fraction:
       return down
     else:
       digit = (down % (interval * 10)) / interval
-      if digit.n % 2:
+      if digit._n % 2:
         return up
       return down
 
   def __trunc__(self):
-    return self.__floor__() if self.n > 0 else self.__ceil__()
+    return self.__floor__() if self._n > 0 else self.__ceil__()
 
   def __floor__(self):
-    return Fraction(self.n // self.d, 1)
+    return Fraction._new(self._n // self._d, 1)
 
   def __ceil__(self):
-    return self.__floor__() + (1 if self.n % self.d else 0)
+    return self.__floor__() + (1 if self._n % self._d else 0)
 
   ##### Numeric methods - binary
 
-  @with_fractions
+  # The common operators skip with_fractions and only parse an operand that
+  # isn't a Fraction already
+
   def __add__(self, f):
-    l = Fraction.lcm(self.d, f.d)
-    return Fraction(self.n * l // self.d + f.n * l // f.d, l)
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    return Fraction._add(self._n, self._d, f._n, f._d)
   __radd__ = __add__
 
-  @with_fractions
   def __sub__(self, f):
-    return self + (-f)
-  @with_fractions
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    return Fraction._add(self._n, self._d, -f._n, f._d)
   def __rsub__(self, f):
+    f = _operand(f)
+    if f is None:
+      return NotImplemented
     return f - self
 
-  @with_fractions
   def __mul__(self, f):
-    return Fraction(self.n * f.n, self.d * f.d)
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    return Fraction._mul(self._n, self._d, f._n, f._d)
   __rmul__ = __mul__
 
-  @with_fractions
   def __truediv__(self, f):
-    return self * (~f)
-  @with_fractions
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    if f._n < 0:
+      return Fraction._mul(self._n, self._d, -f._d, -f._n)
+    elif f._n:
+      return Fraction._mul(self._n, self._d, f._d, f._n)
+    raise ZeroDivisionError
   def __rtruediv__(self, f):
+    f = _operand(f)
+    if f is None:
+      return NotImplemented
     return f / self
 
   @with_fractions
   def __floordiv__(self, f):
-    return (self / f).__floor__()
+    return Fraction._new((self._n * f._d) // (f._n * self._d), 1)
   @with_fractions
   def __rfloordiv__(self, f):
     return f // self
 
   @with_fractions
   def __mod__(self, f):
-    l = Fraction.lcm(self.d, f.d)
-    return Fraction((self.n * l // self.d) % (f.n * l // f.d), l)
+    return Fraction._reduce((self._n * f._d) % (f._n * self._d), self._d * f._d)
   @with_fractions
   def __rmod__(self, f):
     return f % self
@@ -224,50 +365,414 @@ class Fraction:
   def __pow__(self, f):
     if f < 0:
       return (~self) ** (-f)
-    elif f.d == 1:
-      return Fraction(self.n ** f.n, self.d ** f.n)
+    elif f._d == 1:
+      return Fraction(self._n ** f._n, self._d ** f._n)
     else:
-      return Fraction(self.n ** float(f), self.d ** float(f))
+      return Fraction(self._n ** float(f), self._d ** float(f))
   @with_fractions
   def __rpow__(self, f):
     return f ** self
 
   @with_fractions(int_only=True)
   def __lshift__(self, f):
-    return Fraction(self.n << f.n)
+    return Fraction(self._n << f._n)
   @with_fractions(int_only=True)
   def __rlshift__(self, f):
     return f << self
 
   @with_fractions(int_only=True)
   def __rshift__(self, f):
-    return Fraction(self.n >> f.n)
+    return Fraction(self._n >> f._n)
   @with_fractions(int_only=True)
   def __rrshift__(self, f):
     return f >> self
 
   @with_fractions(int_only=True)
   def __and__(self, f):
-    return Fraction(self.n & f.n)
+    return Fraction(self._n & f._n)
   __rand__ = __and__
 
   @with_fractions(int_only=True)
   def __xor__(self, f):
-    return Fraction(self.n ^ f.n)
+    return Fraction(self._n ^ f._n)
   __rxor__ = __xor__
 
   @with_fractions(int_only=True)
   def __or__(self, f):
-    return Fraction(self.n | f.n)
+    return Fraction(self._n | f._n)
   __ror__ = __or__
 
   ##### Numeric methods - comparison
 
-  @with_fractions
   def __eq__(self, f):
-    return self.n == f.n and self.d == f.d
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    return self._n == f._n and self._d == f._d
+
+  def __lt__(self, f):
+    if not isinstance(f, Fraction):
+      f = _operand(f)
+      if f is None:
+        return NotImplemented
+    return self._n * f._d < f._n * self._d
+
+_small_ints = [Fraction._new(i, 1) for i in range(-SMALL_INTS, SMALL_INTS + 1)]
+
+class FractionArray:
+  """A sequence of fractions stored as parallel lists of numerators and
+  denominators, for arithmetic on many values at once.
+
+  Results of the operators aren't reduced until they're read back as Fraction
+  objects, or until a denominator passes limit bits. Denominators are always
+  positive.
+  """
+
+  __slots__ = ('n', 'd', 'limit')
+
+  def __init__(self, values=(), limit=REDUCE_BITS):
+    fractions = [Fraction.parse(x) for x in values]
+    self.n = [f._n for f in fractions]
+    self.d = [f._d for f in fractions]
+    self.limit = limit
+
+  @staticmethod
+  def _new(n, d, limit):
+    """Make an array of the lists n and d as they are."""
+    a = object.__new__(FractionArray)
+    (a.n, a.d, a.limit) = (n, d, limit)
+    return a
+
+  def _bounded(self, n, d):
+    """Make an array of n and d with every element over limit reduced."""
+    limit = self.limit
+    for (i, x) in enumerate(d):
+      if x.bit_length() > limit:
+        g = gcd(n[i], x)
+        (n[i], d[i]) = (n[i]//g, x//g)
+    return FractionArray._new(n, d, limit)
+
+  def _operands(self, other):
+    """Numerator and denominator lists of other, as long as this array."""
+    if isinstance(other, FractionArray):
+      if len(other.n) != len(self.n):
+        raise ValueError('cannot combine FractionArrays of length {} and {}'
+          .format(len(self.n), len(other.n)))
+      return (other.n, other.d)
+    if isinstance(other, LazyFraction):
+      f = other.fraction()
+    else:
+      f = _operand(other)
+      if f is None:
+        return None
+    return ([f._n] * len(self.n), [f._d] * len(self.n))
+
+  def to_list(self):
+    return [Fraction._reduce(n, d) for (n, d) in zip(self.n, self.d)]
+
+  def normalize(self):
+    """Reduce every element in place."""
+    for (i, (n, d)) in enumerate(zip(self.n, self.d)):
+      g = gcd(n, d)
+      if g != 1:
+        (self.n[i], self.d[i]) = (n//g, d//g)
+
+  def __repr__(self):
+    return '<FractionArray [{}]>'.format(', '.join(map(str, self)))
+
+  def __len__(self):
+    return len(self.n)
+
+  def __iter__(self):
+    return iter(self.to_list())
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return FractionArray._new(self.n[i], self.d[i], self.limit)
+    return Fraction._reduce(self.n[i], self.d[i])
+
+  ##### Elementwise arithmetic, with another array or a single number
+
+  def __add__(self, other):
+    other = self._operands(other)
+    if other is None:
+      return NotImplemented
+    n = [a + b if x == y else a*y + b*x
+      for (a, x, b, y) in zip(self.n, self.d, *other)]
+    d = [x if x == y else x*y for (x, y) in zip(self.d, other[1])]
+    return self._bounded(n, d)
+  __radd__ = __add__
+
+  def __neg__(self):
+    return FractionArray._new([-a for a in self.n], self.d[:], self.limit)
+
+  def __sub__(self, other):
+    other = self._operands(other)
+    if other is None:
+      return NotImplemented
+    return self + FractionArray._new([-b for b in other[0]], other[1], self.limit)
+  def __rsub__(self, other):
+    return -self + other
+
+  def __mul__(self, other):
+    other = self._operands(other)
+    if other is None:
+      return NotImplemented
+    n = [a*b for (a, b) in zip(self.n, other[0])]
+    d = [x*y for (x, y) in zip(self.d, other[1])]
+    return self._bounded(n, d)
+  __rmul__ = __mul__
+
+  def __truediv__(self, other):
+    other = self._operands(other)
+    if other is None:
+      return NotImplemented
+    if not all(other[0]):
+      raise ZeroDivisionError
+    n = [a*y if b > 0 else -a*y for (a, b, y) in zip(self.n, *other)]
+    d = [x*abs(b) for (x, b) in zip(self.d, other[0])]
+    return self._bounded(n, d)
+  def __rtruediv__(self, other):
+    other = self._operands(other)
+    if other is None:
+      return NotImplemented
+    return FractionArray._new(*other, self.limit) / self
+
+  ##### Reductions
+
+  def sum(self):
+    return FractionArray._sum(zip(self.n, self.d), self.limit)
+
+  def dot(self, other):
+    if not isinstance(other, FractionArray):
+      other = FractionArray(other)
+    (n, d) = self._operands(other)
+    return FractionArray._sum(
+      ((a*b, x*y) for (a, x, b, y) in zip(self.n, self.d, n, d)), self.limit
+    )
+
+  @staticmethod
+  def _sum(pairs, limit):
+    """Add up (n, d) pairs on a common denominator, reducing only when it
+    passes limit bits. If the reduced sum is still that long, the limit
+    doubles so that reducing doesn't happen every step from then on."""
+    (n, d) = (0, 1)
+    for (a, x) in pairs:
+      if x == d:
+        n += a
+      else:
+        (n, d) = (n*x + a*d, d*x)
+      if d.bit_length() > limit:
+        g = gcd(n, d)
+        (n, d) = (n//g, d//g)
+        limit = max(limit, 2 * d.bit_length())
+    return Fraction._reduce(n, d)
+
+def _delegate(name):
+  """Make a LazyFraction method that reduces its operands and calls the
+  Fraction method of the same name."""
+
+  method = getattr(Fraction, name)
+
+  def delegate(self, *args):
+    args = [x.fraction() if isinstance(x, LazyFraction) else x for x in args]
+    return _lazy(method(self.fraction(), *args), self.limit)
+
+  delegate.__name__ = name
+  return delegate
+
+def _lazy(x, limit):
+  """Turn Fraction results, alone or in a tuple, into LazyFraction."""
+
+  if isinstance(x, Fraction):
+    return LazyFraction._new(x._n, x._d, limit)
+  elif isinstance(x, tuple):
+    return tuple(_lazy(y, limit) for y in x)
+  return x
+
+@total_ordering
+class LazyFraction:
+  """A Fraction that carries its numerator and denominator through arithmetic
+  unreduced, for long chains where only the end result needs reducing.
+
+  It reduces when asked to with normalize(), when it's printed, hashed or read
+  through n and d, and whenever its denominator passes limit bits. Values are
+  always exactly those Fraction would give.
+
+  Only + - * / and comparisons are done lazily. Everything else Fraction
+  supports, like // % ** divmod(), round(), math.floor() and format(), reduces
+  and goes through Fraction, and Fraction results come back as LazyFraction.
+  Fraction.parse and Fraction() accept a LazyFraction, and a Fraction operand
+  mixed with a LazyFraction gives a LazyFraction.
+  """
+
+  __slots__ = ('_n', '_d', 'limit')
+
+  def __init__(self, n, d=1, limit=REDUCE_BITS):
+    if isinstance(n, int) and isinstance(d, int):
+      if d == 0:
+        raise ZeroDivisionError
+      (self._n, self._d) = (-n, -d) if d < 0 else (n, d)
+    else:
+      f = Fraction(n, d)
+      (self._n, self._d) = (f._n, f._d)
+    self.limit = limit
+
+  @staticmethod
+  def _new(n, d, limit):
+    """Make n/d for d > 0, reducing it if d is over limit bits. A limit that
+    the reduced value still passes doubles so it won't reduce every step."""
+    if d.bit_length() > limit:
+      g = gcd(n, d)
+      (n, d) = (n//g, d//g)
+      limit = max(limit, 2 * d.bit_length())
+    f = object.__new__(LazyFraction)
+    (f._n, f._d, f.limit) = (n, d, limit)
+    return f
+
+  @staticmethod
+  def _operand(x):
+    """Numerator and denominator of the other operand of an operator, or None
+    if it can't be one."""
+    if isinstance(x, LazyFraction):
+      return (x._n, x._d)
+    f = _operand(x)
+    if f is None:
+      return None
+    return (f._n, f._d)
+
+  def normalize(self):
+    """Reduce in place, and return self."""
+    g = gcd(self._n, self._d)
+    if g != 1:
+      (self._n, self._d) = (self._n//g, self._d//g)
+    return self
+
+  def fraction(self):
+    self.normalize()
+    return Fraction._new(self._n, self._d)
+
+  @property
+  def n(self):
+    return self.normalize()._n
+
+  @property
+  def d(self):
+    return self.normalize()._d
+
+  def __repr__(self):
+    return '<LazyFraction {}>'.format(str(self))
+
+  def __str__(self):
+    return str(self.fraction())
+
+  def __hash__(self):
+    return hash(self.fraction())
+
+  def __bool__(self):
+    return self._n != 0
+
+  def __float__(self):
+    return self._n / self._d
+
+  def __int__(self):
+    return int(self.fraction())
+
+  ##### Arithmetic
+
+  def __neg__(self):
+    return LazyFraction._new(-self._n, self._d, self.limit)
+
+  def __pos__(self):
+    return LazyFraction._new(self._n, self._d, self.limit)
+
+  def __abs__(self):
+    return LazyFraction._new(abs(self._n), self._d, self.limit)
+
+  def __invert__(self):
+    if self._n < 0:
+      return LazyFraction._new(-self._d, -self._n, self.limit)
+    elif self._n:
+      return LazyFraction._new(self._d, self._n, self.limit)
+    raise ZeroDivisionError
+
+  def __add__(self, f):
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    (n, d) = f
+    if d == self._d:
+      return LazyFraction._new(self._n + n, d, self.limit)
+    return LazyFraction._new(self._n*d + n*self._d, self._d*d, self.limit)
+  __radd__ = __add__
+
+  def __sub__(self, f):
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    return self + LazyFraction._new(-f[0], f[1], self.limit)
+  def __rsub__(self, f):
+    return -self + f
+
+  def __mul__(self, f):
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    return LazyFraction._new(self._n * f[0], self._d * f[1], self.limit)
+  __rmul__ = __mul__
+
+  def __truediv__(self, f):
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    (n, d) = f
+    if n < 0:
+      return LazyFraction._new(-self._n * d, self._d * -n, self.limit)
+    elif n:
+      return LazyFraction._new(self._n * d, self._d * n, self.limit)
+    raise ZeroDivisionError
+  def __rtruediv__(self, f):
+    return ~self * f
+
+  ##### Comparison, by cross-multiplying so nothing needs reducing
+
+  def __eq__(self, f):
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    return self._n * f[1] == f[0] * self._d
 
-  @with_fractions
   def __lt__(self, f):
-    l = Fraction.lcm(self.d, f.d)
-    return (self.n * l // self.d) < (f.n * l // f.d)
+    f = LazyFraction._operand(f)
+    if f is None:
+      return NotImplemented
+    return self._n * f[1] < f[0] * self._d
+
+  ##### Everything else, through Fraction
+
+  __floordiv__ = _delegate('__floordiv__')
+  __rfloordiv__ = _delegate('__rfloordiv__')
+  __mod__ = _delegate('__mod__')
+  __rmod__ = _delegate('__rmod__')
+  __divmod__ = _delegate('__divmod__')
+  __rdivmod__ = _delegate('__rdivmod__')
+  __pow__ = _delegate('__pow__')
+  __rpow__ = _delegate('__rpow__')
+  __lshift__ = _delegate('__lshift__')
+  __rlshift__ = _delegate('__rlshift__')
+  __rshift__ = _delegate('__rshift__')
+  __rrshift__ = _delegate('__rrshift__')
+  __and__ = _delegate('__and__')
+  __rand__ = _delegate('__rand__')
+  __xor__ = _delegate('__xor__')
+  __rxor__ = _delegate('__rxor__')
+  __or__ = _delegate('__or__')
+  __ror__ = _delegate('__ror__')
+  __round__ = _delegate('__round__')
+  __trunc__ = _delegate('__trunc__')
+  __floor__ = _delegate('__floor__')
+  __ceil__ = _delegate('__ceil__')
+  __complex__ = _delegate('__complex__')
+  __index__ = _delegate('__index__')
+  __format__ = _delegate('__format__')
@@ -1,84 +1,369 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
-import sys,time,math
+import sys,time,struct,heapq
+from collections import Counter
+
+import container
+from container import pool_map,open_file
+from instrument import QUIET,ConsoleHooks
 
 VERBOSE = False
 DEBUG = False
 
-def huff(instr):
+BLOCK_SIZE = 256*1024
+# the most blocks dehuff_blocks() sends to one worker at a time
+RUN_BLOCKS = 16
+BLOCK_MAGIC = b'\x00'*3+b'\x01'
+BLOCK_HEADER = struct.Struct('>IIi')
+INDEX = container.SeekIndex(b'HFIX',struct.Struct('>QQIIi'),
+    BLOCK_MAGIC,BLOCK_HEADER)
+TABLE_WIDTH_BITS = 5
+
+# hooks is an instrument.Hooks that gets told about every phase
+def huff(instr,counts=None,hooks=None):
+
+  hooks = hooks or QUIET
+  with hooks.phase('huff',len(instr)) as phase:
+    with hooks.phase('count',len(instr)):
+      counts = count_symbols(instr) if counts is None else counts
+    with hooks.phase('code') as sub:
+      code = make_code(counts)
+      sub.stats['symbols'] = len(code)
+
+    if DEBUG:
+      print('')
+    with hooks.phase('encode',len(instr)) as sub:
+      stream = BitWriter()
+      data = code_bits(code,counts)
+      header = stream.write_code_table(code,data)
+      stream.write_symbols(instr,code)
+      out = stream.to_bytes()
+      sub.stats.update(header_bits=header,data_bits=data)
+
+    if VERBOSE:
+      print('\nHeader: %s bytes' % ((header+7)//8))
+      print('Data: %s bytes' % (data//8))
+
+    phase.stats.update(bytes_in=len(instr),bytes_out=len(out))
+
+  return out
+
+def make_code(counts):
 
-  freq = [(byte,instr.count(byte)) for byte in set(instr)]
-  freq = sorted(freq,key=lambda a:a[1],reverse=True)
+  freq = sorted(counts.items(),key=lambda a:(-a[1],a[0]))
 
   if VERBOSE:
-    print '\n'.join([str(x) for x in freq])+'\n'
+    print('\n'.join([str(x) for x in freq])+'\n')
 
   if len(freq)==1:
-    code = {freq[0][0]:'0'}
-  elif len(freq)==2:
-    code = {freq[0][0]:'0',freq[1][0]:'1'}
+    lengths = {freq[0][0]:1}
   else:
     tree = build_tree(freq)
     if DEBUG:
-      print ''
-    code = decode_tree(tree)
+      print('')
+    lengths = code_lengths(tree)
+  code = canonical_code(lengths)
 
   if DEBUG:
-    print ''
+    print('')
   if VERBOSE:
     for (char,_) in sorted(freq,key=lambda a:a[0]):
-      print '%2s = %s' % (char.replace('\n','\\n'),code[char])
+      print('%3s = %s' % (char,code[char]))
 
-  if DEBUG:
-    print ''
-  stream = CodeStream()
-  for c in reversed(instr):
-    stream.insert(code[c])
-  stream.insert_code_table(code)
+  return code
 
-  return stream.to_str()
+# how many bits the symbols take with the given code, or None if it can't
+# encode all of them
+def code_bits(code,counts):
 
-def dehuff(instr):
+  total = 0
+  for (char,count) in counts.items():
+    if count:
+      if char not in code:
+        return None
+      total += count*len(code[char])
+  return total
 
-  tic = time.time()
+# Counts every symbol in one pass. Passing the counts from an earlier call adds
+# to them, and counts from separate chunks or workers can be merged with +, so
+# frequencies can be gathered a piece at a time.
+def count_symbols(instr,counts=None):
 
-  stream = DecodeStream(instr)
-  decode = stream.parse_code_table()
-  mapping = [(alias,char) for (alias,char) in decode.items()]
-  if VERBOSE:
-    for (alias,char) in sorted(mapping,key=lambda a:a[1]):
-      print '%2s = %s' % (char.replace('\n','\\n'),alias)
+  counts = Counter() if counts is None else counts
+  counts.update(instr)
+  return counts
 
-  s = ''
-  char = ''
-  while True:
-    char = stream.next_char(decode)
-    if char:
-      s += char
-      if DEBUG:
-        print s
+def dehuff(instr,workers=1,hooks=None):
+
+  hooks = hooks or QUIET
+  with hooks.phase('dehuff',len(instr)) as phase:
+    if instr.startswith(BLOCK_MAGIC):
+      s = dehuff_blocks(instr,workers)
     else:
-      break
+      with hooks.phase('table') as sub:
+        stream = BitReader(instr)
+        decode = stream.parse_code_table()
+        mapping = [(alias,char) for (alias,char) in decode.items()]
+        if VERBOSE:
+          for (alias,char) in sorted(mapping,key=lambda a:a[1]):
+            print('%3s = %s' % (char,alias))
+        table = DecodeTable(decode)
+        sub.stats.update(symbols=len(decode),header_bits=stream.pos)
+      with hooks.phase('decode',len(instr)):
+        s = table.decode(instr,stream.pos,8*len(instr))
+    phase.stats.update(bytes_in=len(instr),bytes_out=len(s))
 
   return s
 
+# Adaptive block mode. Every block is coded with either a fresh code table or
+# the table of the last block that had one, whichever comes out smaller, so
+# a table is only written when the statistics have changed enough to pay for
+# it. The container is BLOCK_MAGIC, then a (coded length,original length,
+# table block) header before every block, where the table block is -1 for a
+# block with its own table. A block with its own table is the 0..01 padding,
+# the canonical code lengths from write_lengths() and its data, and a block
+# without one is just the padding and its data. Any block can be decoded on
+# its own given the block holding its table, so blocks can be decoded in
+# parallel or picked out for random access.
+class BlockEncoder(object):
+
+  def __init__(self):
+
+    self.index = 0
+    self.table = None
+    self.code = None
+
+  # returns the header and coded block
+  def encode(self,block):
+
+    counts = count_symbols(block)
+    code = make_code(counts)
+    data = code_bits(code,counts)
+    table = lengths_bits(code)
+    fresh = 8+table+data
+    if self.code is not None:
+      reuse = code_bits(self.code,counts)
+      if reuse is not None and reuse+8<=fresh:
+        stream = BitWriter()
+        stream.write(1,8-reuse%8)
+        stream.write_symbols(block,self.code)
+        coded = stream.to_bytes()
+        self.index += 1
+        return (BLOCK_HEADER.pack(len(coded),len(block),self.table),coded)
+
+    stream = BitWriter()
+    stream.write(1,8-(table+data)%8)
+    write_lengths(stream,code)
+    stream.write_symbols(block,code)
+    coded = stream.to_bytes()
+    (self.table,self.code) = (self.index,code)
+    self.index += 1
+    return (BLOCK_HEADER.pack(len(coded),len(block),-1),coded)
+
+def huff_blocks(instr,block_size=BLOCK_SIZE):
+
+  encoder = BlockEncoder()
+  out = bytearray(BLOCK_MAGIC)
+  for i in range(0,len(instr),block_size):
+    (header,coded) = encoder.encode(instr[i:i+block_size])
+    out += header
+    out += coded
+  return bytes(out)
+
+# Blocks go to the pool in runs of up to RUN_BLOCKS that share a table. A
+# run that doesn't start with the block holding its table only carries the
+# bytes of that table, so each table is sent and parsed once per run.
+def dehuff_blocks(instr,workers=1):
+
+  jobs = []
+  tables = {}
+  for (i,(coded,_,_,table)) in enumerate(read_blocks(instr)):
+    if table<0:
+      tables[i] = coded[:table_end(coded)]
+      jobs.append((None,[coded]))
+    elif len(jobs[-1][1])<RUN_BLOCKS:
+      jobs[-1][1].append(coded)
+    else:
+      jobs.append((tables[table],[coded]))
+  return b''.join(pool_map(dehuff_run,jobs,workers))
+
+# Decodes (table,blocks), a run of blocks that share a table. If table is
+# None the first block holds it, and otherwise table is the start of the
+# block that does.
+def dehuff_run(job):
+
+  (table,blocks) = job
+  if table is None:
+    stream = BitReader(blocks[0])
+    decoder = read_block_table(stream)
+    out = [decoder.decode(blocks[0],stream.pos,8*len(blocks[0]))]
+    blocks = blocks[1:]
+  else:
+    (decoder,out) = (read_block_table(BitReader(table)),[])
+  for coded in blocks:
+    out.append(dehuff_block(coded,decoder))
+  return b''.join(out)
+
+# Decodes one block, with the decoder for the table it borrows if it doesn't
+# have its own
+def dehuff_block(coded,decoder=None):
+
+  stream = BitReader(coded)
+  if decoder is None:
+    decoder = read_block_table(stream)
+  else:
+    while stream.read(1)==0:
+      pass
+  return decoder.decode(coded,stream.pos,8*len(coded))
+
+# how many bytes of a block its padding and table take up
+def table_end(coded):
+
+  stream = BitReader(coded)
+  while stream.read(1)==0:
+    pass
+  read_lengths(stream)
+  return (stream.pos+7)//8
+
+# skips a block's padding and reads the table that follows it
+def read_block_table(stream):
+
+  while stream.read(1)==0:
+    pass
+  return DecodeTable(decode_map(read_lengths(stream)))
+
+# yields (coded block,offset,original length,table block) for every block
+def read_blocks(instr):
+
+  pos = len(BLOCK_MAGIC)
+  while pos<len(instr):
+    (length,original,table) = BLOCK_HEADER.unpack_from(instr,pos)
+    pos += BLOCK_HEADER.size
+    yield (instr[pos:pos+length],pos,original,table)
+    pos += length
+
+# Decodes only the blocks that overlap start:start+length, plus the code table
+# of any block they borrow one from, using the index that INDEX.write() saved
+# if there is one. Single files have no blocks, so those still have to be
+# decoded whole.
+def read_range(path,start,length,index_path=None):
+
+  index = INDEX.load(path,index_path)
+  if index is None:
+    with open(path,'rb') as f:
+      return dehuff(f.read())[start:start+length]
+  if not index:
+    return b''
+
+  (blocks,skip) = container.overlapping(index,start,length)
+  out = []
+  decoders = {}
+  with open(path,'rb') as f:
+    for (_,pos,size,_,table) in blocks:
+      f.seek(pos)
+      coded = f.read(size)
+      if table<0:
+        out.append(dehuff_block(coded))
+        continue
+      if table not in decoders:
+        f.seek(index[table][1])
+        decoders[table] = read_block_table(BitReader(f.read(index[table][2])))
+      out.append(dehuff_block(coded,decoders[table]))
+  return b''.join(out)[skip:skip+length]
+
+# Streaming versions of huff_blocks() and dehuff() that hold at most one block
+# at a time. Both return (bytes read,bytes written).
+def huff_stream(in_fp,out_fp,block_size=BLOCK_SIZE):
+
+  encoder = BlockEncoder()
+  out_fp.write(BLOCK_MAGIC)
+  (inlen,outlen) = (0,len(BLOCK_MAGIC))
+  while True:
+    block = in_fp.read(block_size)
+    if not block:
+      break
+    (header,coded) = encoder.encode(block)
+    out_fp.write(header)
+    out_fp.write(coded)
+    inlen += len(block)
+    outlen += len(header)+len(coded)
+  return (inlen,outlen)
+
+def dehuff_stream(in_fp,out_fp):
+
+  magic = in_fp.read(len(BLOCK_MAGIC))
+  if magic!=BLOCK_MAGIC:
+    instr = magic+in_fp.read()
+    s = dehuff(instr)
+    out_fp.write(s)
+    return (len(instr),len(s))
+
+  # only the table of the last block that had one is ever needed again
+  (index,last,decoder) = (0,None,None)
+  (inlen,outlen) = (len(magic),0)
+  while True:
+    header = in_fp.read(BLOCK_HEADER.size)
+    if not header:
+      break
+    (length,_,table) = BLOCK_HEADER.unpack(header)
+    coded = in_fp.read(length)
+    if table<0:
+      stream = BitReader(coded)
+      (last,decoder) = (index,read_block_table(stream))
+      s = decoder.decode(coded,stream.pos,8*len(coded))
+    elif table==last:
+      s = dehuff_block(coded,decoder)
+    else:
+      raise ValueError('block %s refers to table %s' % (index,table))
+    out_fp.write(s)
+    index += 1
+    inlen += BLOCK_HEADER.size+len(coded)
+    outlen += len(s)
+  return (inlen,outlen)
+
 def build_tree(code):
 
-  code = code[:-2]+[BinaryTree(code[-2],code[-1])]
-  while len(code)>1:
+  # the heap holds (weight,order,node) so ties always merge in the same order
+  # and two nodes are never compared directly
+  heap = [(value(obj),i,obj) for (i,obj) in enumerate(code)]
+  heapq.heapify(heap)
+  order = len(heap)
+  while len(heap)>1:
     if DEBUG:
-      print code
-    if len(code)==2:
-      code = [BinaryTree(code[0],code[1])]
-      continue
-    values = [(i,obj) for (i,obj) in enumerate(code)]
-    values = sorted(values,key=lambda a:value(a[1]))
-    left = min(values[0][0],values[1][0])
-    right = max(values[0][0],values[1][0])
-    tree = BinaryTree(code[left],code[right])
-    code[right] = tree
-    del code[left]
-  return code[0]
+      print([node for (_,_,node) in heap])
+    (_,_,left) = heapq.heappop(heap)
+    (_,_,right) = heapq.heappop(heap)
+    tree = BinaryTree(left,right)
+    heapq.heappush(heap,(tree.total,order,tree))
+    order += 1
+  return heap[0][2]
+
+def code_lengths(tree):
+
+  lengths = {}
+  stack = [(tree,0)]
+  while stack:
+    (node,depth) = stack.pop()
+    if isinstance(node,tuple):
+      lengths[node[0]] = max(depth,1)
+    else:
+      stack.append((node.left,depth+1))
+      stack.append((node.right,depth+1))
+  return lengths
+
+# Canonical codes are handed out in order of (length,symbol), so the lengths
+# alone are enough to rebuild the whole table.
+def canonical_code(lengths):
+
+  code = {}
+  alias = 0
+  last = 0
+  for (char,length) in sorted(lengths.items(),key=lambda a:(a[1],a[0])):
+    alias <<= length-last
+    code[char] = bin(alias)[2:].zfill(length)
+    alias += 1
+    last = length
+  return code
 
 def value(obj):
 
@@ -89,22 +374,6 @@ def value(obj):
   else:
     raise TypeError
 
-def decode_tree(tree,code=None,prefix=None):
-
-  code = {} if code is None else code
-  prefix = prefix or ''
-  if DEBUG:
-    print 'code: %s | prefix: %s | left: %s | right: %s' % (len(code),prefix,tree.left,tree.right)
-  if isinstance(tree.left,tuple):
-    code[tree.left[0]] = prefix+'0'
-  else:
-    decode_tree(tree.left,code,prefix+'0')
-  if isinstance(tree.right,tuple):
-    code[tree.right[0]] = prefix+'1'
-  else:
-    decode_tree(tree.right,code,prefix+'1')
-  return code
-
 class BinaryTree(object):
 
   def __init__(self,left,right):
@@ -119,162 +388,279 @@ class BinaryTree(object):
 
   __repr__ = __str__
 
-class CodeStream(object):
+# Packs bits into an integer accumulator and moves whole bytes into a bytearray
+# every FLUSH bits, so writing never copies what was already written. The
+# layout is the same as the old prepending CodeStream:
+#
+#   [alias length bits][0..01 padding][length][alias][byte]...[0*length][text]
+#
+# where the padding makes the whole file a multiple of 8 bits.
+class BitWriter(object):
 
-  EXAMPLE = '000001[alias]100[byte][alias]100[byte]100[text]'
+  FLUSH = 1024
 
-  def __init__(self,byte_string=None):
+  def __init__(self):
 
-    self.hanging = ''
-    self.string = byte_string or ''
+    self.out = bytearray()
+    self.acc = 0
+    self.bits = 0
 
-  def insert(self,value,pad=0):
+  def write(self,value,bits):
 
-    if isinstance(value,int):
-      value = bin(value)[2:]
-    elif not isinstance(value,str):
-      raise TypeError
+    self.acc = (self.acc<<bits)|value
+    self.bits += bits
+    if self.bits>=self.FLUSH:
+      self.flush()
 
-    if pad and len(value)<pad:
-      value = '0'*((pad-len(value)%pad)%pad)+value
-    if DEBUG:
-      print '%s + %s + %s' % (value,self.hanging,'|'.join([bin(ord(x))[2:].zfill(8) for x in self.string[:4]]))
-    self.hanging = value+self.hanging
-    while len(self.hanging)>7:
-      self.string = chr(int(self.hanging[-8:],2))+self.string
-      self.hanging = self.hanging[:-8]
-    if DEBUG:
-      print '= %s + %s' % (self.hanging,'|'.join([bin(ord(x))[2:].zfill(8) for x in self.string[:4]]))
-      print '-'*40
+  # Codes are looked up and joined a chunk at a time in C, and the joined
+  # '0'/'1' string is turned into one integer, instead of shifting in every
+  # symbol from a Python loop.
+  def write_symbols(self,symbols,code,chunk=64*1024):
 
-  def insert_code_table(self,code):
+    lookup = code.__getitem__
+    for i in range(0,len(symbols),chunk):
+      bits = ''.join(map(lookup,symbols[i:i+chunk]))
+      if bits:
+        self.write(int(bits,2),len(bits))
 
-    if VERBOSE:
-      data = len(self.string)+(1 if self.hanging else 0)
+  # data is how many bits write_symbols() will add, needed for the padding
+  def write_code_table(self,code,data):
 
     length = min_bits(max([len(x) for x in code.values()]))
+    table = table_bits(code)
 
-    self.insert('0',length)
-
+    self.write(length,8)
+    self.write(1,8-(table+data)%8)
     for (char,alias) in code.items():
-      self.insert(ord(char),8)
-      self.insert(alias)
-      self.insert(len(alias),length)
+      self.write(len(alias),length)
+      self.write(int(alias,2),len(alias))
+      self.write(char,8)
+    self.write(0,length)
+    return 8+8-(table+data)%8+table
 
-    self.string = chr(int(('1'+self.hanging).zfill(8),2))+self.string
-    self.hanging = ''
+  def flush(self):
 
-    self.insert(length,8)
-
-    if VERBOSE:
-      print '\nHeader: %s bytes' % (len(self.string)-data)
-      print 'Data: %s bytes' % data
+    n = self.bits//8
+    if n:
+      self.bits -= 8*n
+      self.out += (self.acc>>self.bits).to_bytes(n,'big')
+      self.acc &= (1<<self.bits)-1
 
-  def to_str(self):
+  def to_bytes(self):
 
-    return self.string
+    self.flush()
+    if self.bits:
+      self.write(0,8-self.bits)
+      self.flush()
+    return bytes(self.out)
 
   def __str__(self):
 
-    return '<CodeStream %s:%s>' % (len(self.string),len(self.hanging))
+    return '<BitWriter %s:%s>' % (len(self.out),self.bits)
 
-def min_bits(integer):
+# size of a code table without the leading length byte and padding
+def table_bits(code):
 
-  return 1 if integer==0 else int(math.log(integer,2))+1
+  length = min_bits(max([len(x) for x in code.values()]))
+  return length+sum([length+len(alias)+8 for alias in code.values()])
 
-class DecodeStream(object):
+# Canonical tables are the code length of every symbol in the alphabet, 0 for
+# unused ones, each in a field as wide as the longest after a TABLE_WIDTH_BITS
+# field holding that width. A width of 0 means the table is empty.
+def write_lengths(writer,code,size=256):
 
-  def __init__(self,byte_string):
+  width = lengths_width(code)
+  writer.write(width,TABLE_WIDTH_BITS)
+  for sym in range(size if width else 0):
+    writer.write(len(code.get(sym,'')),width)
 
-    self.string = byte_string
-    self.hanging = ''
+def read_lengths(stream,size=256):
 
-  def next_bit(self):
+  width = stream.read(TABLE_WIDTH_BITS)
+  lengths = {}
+  for sym in range(size if width else 0):
+    length = stream.read(width)
+    if length:
+      lengths[sym] = length
+  return lengths
 
-    if not self.hanging:
-      if not self.string:
-        return None
-      self.hanging = bin(ord(self.string[0]))[2:].zfill(8)
-      self.string = self.string[1:]
+def lengths_bits(code,size=256):
 
-    bit = self.hanging[0]
-    self.hanging = self.hanging[1:]
-    return bit
+  return TABLE_WIDTH_BITS+lengths_width(code)*size
 
-  def next_byte(self):
+def lengths_width(code):
 
-    if self.hanging:
-      raise RuntimeError
+  return min_bits(max([len(x) for x in code.values()])) if code else 0
 
-    s = self.string[0]
-    self.string = self.string[1:]
-    return s
+# the {alias:symbol} map DecodeTable takes, for the code with these lengths
+def decode_map(lengths):
 
-  def next_char(self,decode):
+  return dict((v,k) for (k,v) in canonical_code(lengths).items())
 
-    bit = ''
-    working = ''
-    while True:
-      bit = self.next_bit()
-      if bit is None:
-        return None
-      working += bit
-      char = decode.get(working,None)
-      if char:
-        return char
+def min_bits(integer):
+
+  return max(integer.bit_length(),1)
+
+# Reads big-endian bit fields from bytes; only used for the code table
+class BitReader(object):
+
+  def __init__(self,byte_string,pos=0):
+
+    self.string = byte_string
+    self.pos = pos
+
+  def read(self,bits):
+
+    start = self.pos>>3
+    end = (self.pos+bits+7)>>3
+    value = int.from_bytes(self.string[start:end],'big')
+    value >>= 8*(end-start)-(self.pos&7)-bits
+    self.pos += bits
+    return value&((1<<bits)-1)
 
   def parse_code_table(self):
 
-    length = ord(self.next_byte())
+    length = self.read(8)
 
-    while self.next_bit()=='0':
+    while self.read(1)==0:
       pass
 
     decode = {}
-    working = ''
-    alias = ''
-    alias_length = -1
-
-    while alias_length!=0:
-      working += self.next_bit()
+    while True:
+      alias_length = self.read(length)
+      if alias_length==0:
+        break
+      alias = bin(self.read(alias_length))[2:].zfill(alias_length)
+      decode[alias] = self.read(8)
 
-      if alias:
-        if len(working)==8:
-          decode[alias] = chr(int(working,2))
-          working = ''
-          alias = ''
+    return decode
 
+# Decodes PEEK bits at a time. Every PEEK-bit value maps to all of the whole
+# symbols it starts with and how many bits they use, so one lookup usually
+# yields several symbols. Codes longer than PEEK bits map to a second-level
+# table for their prefix instead. Tables for symbols that aren't characters
+# are built with multi=False and only have the one-symbol entries.
+class DecodeTable(object):
+
+  PEEK = 11
+  REFILL = 32
+
+  def __init__(self,decode,multi=True):
+
+    codes = [(int(alias,2),len(alias),char) for (alias,char) in decode.items()]
+    self.longest = max([length for (_,length,_) in codes])
+    self.peek = peek = min(self.PEEK,self.longest)
+
+    self.single = single = [None]*(1<<peek)
+    longer = {}
+    for (value,length,char) in codes:
+      if length<=peek:
+        shift = peek-length
+        for i in range(value<<shift,(value+1)<<shift):
+          single[i] = (char,length)
       else:
-        if alias_length==-1:
-          if len(working)==length:
-            alias_length = int(working,2)
-            working = ''
-        else:
-          if len(working)==alias_length:
-            alias = working
-            alias_length = -1
-            working = ''
-
-    return decode
+        prefix = value>>(length-peek)
+        longer.setdefault(prefix,[]).append((value,length,char))
+
+    self.subtables = {}
+    for (prefix,group) in longer.items():
+      width = max([length for (_,length,_) in group])-peek
+      sub = [None]*(1<<width)
+      for (value,length,char) in group:
+        rest = value&((1<<(length-peek))-1)
+        shift = width-(length-peek)
+        for i in range(rest<<shift,(rest+1)<<shift):
+          sub[i] = (char,length)
+      self.subtables[prefix] = (width,sub)
+
+    self.table = table = []
+    if not multi:
+      return
+    mask = (1<<peek)-1
+    for value in range(1<<peek):
+      chars = []
+      used = 0
+      while True:
+        entry = single[(value<<used)&mask]
+        if entry is None or used+entry[1]>peek:
+          break
+        chars.append(entry[0])
+        used += entry[1]
+      table.append((bytes(chars),used))
+
+  def decode(self,data,start,end):
+
+    (peek,table,single,subtables) = (self.peek,self.table,self.single,self.subtables)
+    mask = (1<<peek)-1
+    refill = 8*self.REFILL
+
+    out = bytearray()
+    pos = start>>3
+    acc = 0
+    bits = -(start&7)
+    left = end-start
+    while left>0:
+      if bits<self.longest:
+        chunk = data[pos:pos+self.REFILL]
+        pos += self.REFILL
+        acc = (acc&((1<<max(bits,0))-1))<<refill
+        if chunk:
+          acc |= int.from_bytes(chunk,'big')<<(refill-8*len(chunk))
+        bits += refill
+      value = (acc>>(bits-peek))&mask
+      (chars,used) = table[value]
+      if used and left>=peek:
+        out += chars
+      else:
+        # a long code, or too few bits left to trust the whole entry
+        entry = single[value]
+        if entry is None:
+          (width,sub) = subtables[value]
+          entry = sub[(acc>>(bits-peek-width))&((1<<width)-1)]
+        (sym,used) = entry
+        out.append(sym)
+      bits -= used
+      left -= used
+
+    return bytes(out)
 
 if __name__=='__main__':
 
   tic = time.time()
 
-  with open(sys.argv[1],'rb') as f:
-    s = f.read()
-  inlen = len(s)
+  if sys.argv[2]=='i':
+    index = INDEX.write(sys.argv[1],sys.argv[3])
+    print('Indexed %s blocks in %s sec' % (len(index),time.time()-tic))
+
+  # the streaming modes also accept - for stdin/stdout, so they report on stderr
+  elif sys.argv[2] in ('sh','sd'):
+    with open_file(sys.argv[1],'rb') as fin:
+      with open_file(sys.argv[3],'wb') as fout:
+        if sys.argv[2]=='sh':
+          (inlen,outlen) = huff_stream(fin,fout)
+        else:
+          (inlen,outlen) = dehuff_stream(fin,fout)
+    print('%suffman took %s sec' % (['Deh','H'][sys.argv[2]=='sh'],time.time()-tic),file=sys.stderr)
+    print('(out %s) / (in %s) = %s%%' % (outlen,inlen,100*outlen//max(inlen,1)),file=sys.stderr)
 
-  if sys.argv[2]=='h':
-    s = huff(s)
-  elif sys.argv[2]=='d':
-    s = dehuff(s)
   else:
-    raise RuntimeError('invalid option "%s"' % sys.argv[2])
-  with open(sys.argv[3],'wb') as f:
-    f.write(s)
-  outlen = len(s)
-
-  print ''
-  print '%suffman took %s sec' % (['Deh','H'][sys.argv[2]=='h'],time.time()-tic)
-  print '(out %s) / (in %s) = %s%%\n' % (outlen,inlen,100*outlen/inlen)
+    with open(sys.argv[1],'rb') as f:
+      s = f.read()
+    inlen = len(s)
+
+    workers = int(sys.argv[4]) if len(sys.argv)>4 else None
+    if sys.argv[2]=='h':
+      s = huff(s,hooks=ConsoleHooks())
+    elif sys.argv[2]=='b':
+      s = huff_blocks(s)
+    elif sys.argv[2]=='d':
+      s = dehuff(s,workers,ConsoleHooks())
+    else:
+      raise RuntimeError('invalid option "%s"' % sys.argv[2])
+    with open(sys.argv[3],'wb') as f:
+      f.write(s)
+    outlen = len(s)
+
+    print('')
+    print('%suffman took %s sec' % (['Deh','H'][sys.argv[2]!='d'],time.time()-tic))
+    print('(out %s) / (in %s) = %s%%\n' % (outlen,inlen,100*outlen//inlen))
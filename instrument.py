@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Hooks that the codecs report what they are doing to. Work is split into named
+# phases, and every phase reports its start, its progress along the way and
+# how long it took along with stats like bytes processed or matches found.
+
+import sys,time,numbers
+
+PROGRESS_STEPS = 100
+PROGRESS_INTERVAL = 0.1
+
+# The default hooks ignore everything. They don't ask for progress, so phases
+# never call progress() and an uninstrumented run only pays for a comparison
+# per loop iteration and a start() and end() per phase.
+class Hooks(object):
+
+  progress_steps = 0
+
+  def phase(self,name,total=None):
+
+    return Phase(self,name,total)
+
+  def start(self,name,total):
+
+    pass
+
+  def progress(self,name,done,total):
+
+    pass
+
+  def end(self,name,seconds,stats):
+
+    pass
+
+QUIET = Hooks()
+
+# Used as a context manager around the work. Loops only need to check
+# "if i>=phase.next: phase.update(i)", which is at most progress_steps calls.
+class Phase(object):
+
+  def __init__(self,hooks,name,total=None):
+
+    self.hooks = hooks
+    self.name = name
+    self.total = total
+    self.stats = {}
+    steps = hooks.progress_steps
+    self.step = max(total//steps,1) if steps and total else None
+    self.next = self.step or float('inf')
+
+  def __enter__(self):
+
+    self.tic = time.time()
+    self.hooks.start(self.name,self.total)
+    return self
+
+  def update(self,done):
+
+    self.hooks.progress(self.name,done,self.total)
+    self.next = done+self.step
+
+  def __exit__(self,kind,value,tb):
+
+    if kind is None:
+      self.hooks.end(self.name,time.time()-self.tic,self.stats)
+    return False
+
+# Writes progress lines and what every phase took, like the CLIs always have
+class ConsoleHooks(Hooks):
+
+  progress_steps = PROGRESS_STEPS
+
+  def __init__(self,stream=None,interval=PROGRESS_INTERVAL):
+
+    self.stream = stream or sys.stdout
+    self.interval = interval
+    self.last = 0
+
+  def progress(self,name,done,total):
+
+    now = time.time()
+    if now-self.last>=self.interval:
+      self.last = now
+      self.stream.write('%s... %.2f%%\r' % (name.capitalize(),100.0*done/total))
+      self.stream.flush()
+
+  def end(self,name,seconds,stats):
+
+    line = '%s took %.3f sec' % (name.capitalize(),seconds)
+    if stats:
+      line += ' (%s)' % ', '.join(['%s %s' % (k,v) for (k,v) in sorted(stats.items())])
+    self.stream.write('%-40s\n' % line)
+
+# Keeps the calls, total time and stats of every phase, e.g. to export to a
+# monitoring system. Numeric stats are summed over calls, others keep the last.
+class MetricsHooks(Hooks):
+
+  def __init__(self):
+
+    self.phases = {}
+
+  def end(self,name,seconds,stats):
+
+    phase = self.phases.setdefault(name,{'calls':0,'seconds':0.0})
+    phase['calls'] += 1
+    phase['seconds'] += seconds
+    for (k,v) in stats.items():
+      if isinstance(v,numbers.Number) and not isinstance(v,bool):
+        phase[k] = phase.get(k,0)+v
+      else:
+        phase[k] = v
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+#
+# LZ77 matches feeding straight into Huffman codes, a block at a time.
+# Literals, match lengths and match distances each get their own canonical
+# code per block, and distances are in the original text so the decoder
+# copies from what it has already written.
+
+import sys,time,struct
+from array import array
+from collections import Counter
+
+import compress,container,huffman
+from instrument import QUIET
+
+BLOCK_SIZE = 256*1024
+MAGIC = b'LZHF'
+BLOCK_HEADER = struct.Struct('>II')
+
+# literals are 0-255 and MATCH says a length and distance follow
+MATCH = 256
+LITERALS = 257
+LENGTHS = 256
+DISTANCES = 32
+
+# Matches are found with hash chains over every MIN_WORD bytes of a block, as
+# in deflate. Only the last CHAIN_LENGTH positions with the same hash are
+# tried, so repetitive input costs no more than any other. Matches reach back
+# across the whole block and go up to MAX_MATCH long.
+MIN_MATCH = compress.MIN_WORD
+MAX_MATCH = MIN_MATCH+LENGTHS-1
+CHAIN_LENGTH = 32
+HASH_SIZE = 65521
+
+def lzhuff(instr,block_size=BLOCK_SIZE,hooks=None):
+
+  out = [MAGIC]
+  for i in range(0,len(instr),block_size):
+    block = instr[i:i+block_size]
+    coded = encode_block(block,hooks)
+    out.append(BLOCK_HEADER.pack(len(coded),len(block)))
+    out.append(coded)
+  return b''.join(out)
+
+def unlzhuff(instr):
+
+  if instr[:len(MAGIC)]!=MAGIC:
+    raise ValueError('not an lzhuff archive')
+  out = []
+  pos = len(MAGIC)
+  while pos<len(instr):
+    (length,original) = BLOCK_HEADER.unpack_from(instr,pos)
+    pos += BLOCK_HEADER.size
+    out.append(decode_block(instr[pos:pos+length],original))
+    pos += length
+  return b''.join(out)
+
+def lzhuff_stream(in_fp,out_fp,block_size=BLOCK_SIZE,hooks=None):
+
+  out_fp.write(MAGIC)
+  (inlen,outlen) = (0,len(MAGIC))
+  while True:
+    block = in_fp.read(block_size)
+    if not block:
+      break
+    coded = encode_block(block,hooks)
+    out_fp.write(BLOCK_HEADER.pack(len(coded),len(block)))
+    out_fp.write(coded)
+    inlen += len(block)
+    outlen += BLOCK_HEADER.size+len(coded)
+  return (inlen,outlen)
+
+def unlzhuff_stream(in_fp,out_fp):
+
+  if in_fp.read(len(MAGIC))!=MAGIC:
+    raise ValueError('not an lzhuff archive')
+  (inlen,outlen) = (len(MAGIC),0)
+  while True:
+    header = in_fp.read(BLOCK_HEADER.size)
+    if not header:
+      break
+    (length,original) = BLOCK_HEADER.unpack(header)
+    s = decode_block(in_fp.read(length),original)
+    out_fp.write(s)
+    inlen += BLOCK_HEADER.size+length
+    outlen += len(s)
+  return (inlen,outlen)
+
+# Splits a block into literal runs and matches: a list of (run,length,dist)
+# where the last entry has no match and a length of 0. Every position goes
+# into the chains, and the longest match at each position is taken greedily.
+def tokenize(block,hooks=None):
+
+  n = len(block)
+  head = array('i',[-1])*HASH_SIZE
+  prev = array('i',[-1])*n
+  tokens = []
+  pos = i = 0
+  with (hooks or QUIET).phase('match',n) as phase:
+    while i<=n-MIN_MATCH:
+      if i>=phase.next:
+        phase.update(i)
+      (length,dist) = longest_match(block,i,head,prev)
+      step = length or 1
+      for p in range(i,min(i+step,n-MIN_MATCH+1)):
+        h = int.from_bytes(block[p:p+MIN_MATCH],'big')%HASH_SIZE
+        prev[p] = head[h]
+        head[h] = p
+      if length:
+        tokens.append((block[pos:i],length,dist))
+        pos = i+length
+      i += step
+    phase.stats['matches'] = len(tokens)
+  tokens.append((block[pos:],0,0))
+  return tokens
+
+# (length,distance) of the longest match for block[i:] among the positions
+# chained with it, or (0,0). Matches may overlap the text they copy.
+def longest_match(block,i,head,prev):
+
+  limit = min(MAX_MATCH,len(block)-i)
+  (best,dist) = (MIN_MATCH-1,0)
+  j = head[int.from_bytes(block[i:i+MIN_MATCH],'big')%HASH_SIZE]
+  for _ in range(CHAIN_LENGTH):
+    if j<0:
+      break
+    # a candidate can only beat the best so far if it matches one more byte
+    if block[j+best]==block[i+best]:
+      length = common_length(block,j,i,limit)
+      if length>best:
+        (best,dist) = (length,i-j)
+        if best==limit:
+          break
+    j = prev[j]
+  return (best,dist) if dist else (0,0)
+
+# how many bytes from j and i are the same, up to limit
+def common_length(block,j,i,limit):
+
+  if block[j:j+limit]==block[i:i+limit]:
+    return limit
+  (lo,hi) = (0,limit-1)
+  while lo<hi:
+    mid = (lo+hi+1)//2
+    if block[j:j+mid]==block[i:i+mid]:
+      lo = mid
+    else:
+      hi = mid-1
+  return lo
+
+def encode_block(block,hooks=None):
+
+  tokens = tokenize(block,hooks)
+
+  counts = None
+  (lengths,distances) = (Counter(),Counter())
+  for (run,length,dist) in tokens:
+    counts = huffman.count_symbols(run,counts)
+    if length:
+      lengths[length-compress.MIN_WORD] += 1
+      distances[(dist-1).bit_length()] += 1
+  literals = Counter(counts)
+  literals[MATCH] = len(tokens)-1
+
+  writer = huffman.BitWriter()
+  codes = []
+  for (counts,size) in ((literals,LITERALS),(lengths,LENGTHS),(distances,DISTANCES)):
+    code = huffman.make_code(counts) if counts else {}
+    huffman.write_lengths(writer,code,size)
+    codes.append(code)
+  (lit,length_code,dist_code) = [dict((k,(int(v,2),len(v)))
+      for (k,v) in code.items()) for code in codes]
+
+  for (run,length,dist) in tokens:
+    writer.write_symbols(run,codes[0])
+    if length:
+      writer.write(*lit[MATCH])
+      writer.write(*length_code[length-compress.MIN_WORD])
+      # the bucket is the bit length of dist-1, then the bits below its top bit
+      d = dist-1
+      bucket = d.bit_length()
+      writer.write(*dist_code[bucket])
+      if bucket>1:
+        writer.write(d&((1<<(bucket-1))-1),bucket-1)
+  return writer.to_bytes()
+
+def decode_block(coded,size):
+
+  stream = BitStream(coded)
+  (lit,lengths,distances) = [read_table(stream,n) for n in (LITERALS,LENGTHS,DISTANCES)]
+
+  out = bytearray()
+  while len(out)<size:
+    sym = stream.symbol(lit)
+    if sym<MATCH:
+      out.append(sym)
+      continue
+    length = stream.symbol(lengths)+compress.MIN_WORD
+    bucket = stream.symbol(distances)
+    d = bucket if bucket<2 else (1<<(bucket-1))|stream.read(bucket-1)
+    start = len(out)-d-1
+    if d+1>=length:
+      out += out[start:start+length]
+    else:
+      # the match overlaps itself, so it repeats what it has just copied
+      for i in range(start,start+length):
+        out.append(out[i])
+  return bytes(out)
+
+# the decode table for a huffman.write_lengths() table, or None if it's empty
+def read_table(stream,size):
+
+  lengths = huffman.read_lengths(stream,size)
+  if not lengths:
+    return None
+  return huffman.DecodeTable(huffman.decode_map(lengths),multi=False)
+
+# Reads bit fields and symbols one at a time, refilling from the bytes a
+# chunk at a time like DecodeTable.decode() does
+class BitStream(object):
+
+  REFILL = 32
+
+  def __init__(self,data):
+
+    self.data = data
+    self.pos = 0
+    self.acc = 0
+    self.bits = 0
+
+  def fill(self,need):
+
+    while self.bits<need:
+      chunk = self.data[self.pos:self.pos+self.REFILL] or bytes(self.REFILL)
+      self.pos += self.REFILL
+      self.acc = ((self.acc&((1<<self.bits)-1))<<(8*len(chunk))
+          |int.from_bytes(chunk,'big'))
+      self.bits += 8*len(chunk)
+
+  def read(self,bits):
+
+    self.fill(bits)
+    self.bits -= bits
+    return (self.acc>>self.bits)&((1<<bits)-1)
+
+  def symbol(self,table):
+
+    self.fill(table.longest)
+    value = (self.acc>>(self.bits-table.peek))&((1<<table.peek)-1)
+    entry = table.single[value]
+    if entry is None:
+      (width,sub) = table.subtables[value]
+      entry = sub[(self.acc>>(self.bits-table.peek-width))&((1<<width)-1)]
+    self.bits -= entry[1]
+    return entry[0]
+
+if __name__=='__main__':
+
+  tic = time.time()
+
+  # - is stdin/stdout, so this reports on stderr
+  with container.open_file(sys.argv[1],'rb') as fin:
+    with container.open_file(sys.argv[3],'wb') as fout:
+      if sys.argv[2]=='c':
+        (inlen,outlen) = lzhuff_stream(fin,fout)
+      elif sys.argv[2]=='d':
+        (inlen,outlen) = unlzhuff_stream(fin,fout)
+      else:
+        raise RuntimeError('invalid option "%s"' % sys.argv[2])
+  print('%s took %s sec' % (['Decompress','Compress'][sys.argv[2]=='c'],time.time()-tic),file=sys.stderr)
+  print('(out %s) / (in %s) = %s%%' % (outlen,inlen,100*outlen//max(inlen,1)),file=sys.stderr)
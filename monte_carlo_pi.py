@@ -4,26 +4,276 @@
 # Ac = pi*(1^2) = pi
 #
 # Ac/As = pi/4
+#
+# The quarter circle in the unit square has the same ratio, so points are drawn
+# from [0,1)^2 and need no scaling.
+
+import os,time,math,argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+BATCH = 1<<20
+CHUNK = 16*BATCH
+# A target is only checked from this many points on. A handful of points can
+# easily all land in the circle (or none of them), and then the standard error
+# comes out 0 and would pass any target.
+MIN_SAMPLES = 1000
+# two-sided 95% normal quantile
+Z95 = 1.959963984540054
+
+def generator(seed=None):
+
+  return np.random.Generator(np.random.PCG64(seed))
+
+# How many of n random points in the square land in the circle
+def sample(n,rng,batch=BATCH):
+
+  return sum([hits for (_,hits) in sample_batches(n,rng,batch)])
+
+# Every method yields (points,hits) for each batch, so that a run can stop
+# partway through a chunk. Plain points are drawn into the same two buffers
+# and squared and summed in place, so nothing is allocated per point.
+def sample_batches(n,rng,batch=BATCH):
+
+  x = np.empty(min(n,batch))
+  y = np.empty(min(n,batch))
+  for start in range(0,n,batch):
+    m = min(batch,n-start)
+    (bx,by) = (x[:m],y[:m])
+    rng.random(out=bx)
+    rng.random(out=by)
+    yield (m,inside(bx,by))
+
+# overwrites x and y
+def inside(x,y):
+
+  np.multiply(x,x,out=x)
+  np.multiply(y,y,out=y)
+  np.add(x,y,out=x)
+  return int(np.count_nonzero(x<=1))
+
+# Each batch puts one point in every cell of a k*k grid, and whatever doesn't
+# fill a whole grid is drawn plainly
+def sample_stratified(n,rng,batch=BATCH):
+
+  for start in range(0,n,batch):
+    m = min(batch,n-start)
+    k = math.isqrt(m)
+    cells = np.arange(k*k)
+    x = (cells%k+rng.random(k*k))/k
+    y = (cells//k+rng.random(k*k))/k
+    yield (m,inside(x,y)+sample(m-k*k,rng))
+
+# Every point (x,y) also counts (1-x,1-y). Being in the circle only gets less
+# likely as x and y grow, so the two are negatively correlated and their
+# errors partly cancel.
+def sample_antithetic(n,rng,batch=BATCH):
+
+  for start in range(0,n-n%2,2*batch):
+    m = min(batch,(n-n%2-start)//2)
+    (x,y) = (rng.random(m),rng.random(m))
+    yield (2*m,inside(1-x,1-y)+inside(x,y))
+  if n%2:
+    yield (1,sample(1,rng))
+
+# Sobol points i in natural order are the XOR of the direction numbers for the
+# bits set in i, so a batch starting at a multiple of its power of two size is
+# built by doubling. Every chunk gets its own random digital shift (an XOR) so
+# that chunks stay independent and the estimate stays unbiased.
+def sample_sobol(n,rng,batch=BATCH):
+
+  bits = max(min(batch,n)-1,1).bit_length()
+  shift = rng.integers(0,1<<SOBOL_BITS,2,dtype=np.uint64)
+  for start in range(0,n,1<<bits):
+    m = min(1<<bits,n-start)
+    (x,y) = [sobol_block(start,bits,SOBOL[d],shift[d])[:m] for d in (0,1)]
+    yield (m,inside(x*2.0**-SOBOL_BITS,y*2.0**-SOBOL_BITS))
+
+def sobol_block(start,bits,directions,shift):
+
+  base = shift
+  for b in range(start.bit_length()):
+    if start>>b&1:
+      base ^= directions[b]
+  block = np.array([base],dtype=np.uint64)
+  for b in range(bits):
+    block = np.concatenate((block,block^directions[b]))
+  return block
+
+def sobol_directions(bits=32):
+
+  # dimension 1 is the van der Corput sequence, dimension 2 comes from the
+  # polynomial x+1, i.e. m_k = 2*m_(k-1) xor m_(k-1) with m_1 = 1
+  first = [1<<(bits-1-k) for k in range(bits)]
+  m = [1]
+  for k in range(1,bits):
+    m.append(2*m[-1]^m[-1])
+  second = [m[k]<<(bits-1-k) for k in range(bits)]
+  return [np.array(first,dtype=np.uint64),np.array(second,dtype=np.uint64)]
+
+SOBOL_BITS = 32
+SOBOL = sobol_directions(SOBOL_BITS)
+
+# Halton points in bases 2 and 3, rotated by a random offset (mod 1) per chunk
+def sample_halton(n,rng,batch=BATCH):
+
+  offset = rng.random(2)
+  for start in range(0,n,batch):
+    index = np.arange(start,min(start+batch,n))
+    x = (radical_inverse(index,2)+offset[0])%1
+    y = (radical_inverse(index,3)+offset[1])%1
+    yield (len(index),inside(x,y))
+
+# Digits are reversed a group at a time through a table of the radical
+# inverses of every group, e.g. 16 bits at once in base 2
+def radical_inverse(index,base):
 
-import random
-
-def main():
-
-  r = random.SystemRandom()
-  steps = 0
-  circle = 0
-  square = 0
-  while True:
-    for i in range(1000000):
-      x = r.random()*2-1
-      y = r.random()*2-1
-      if x**2+y**2<=1:
-        circle += 1
-      else:
-        square += 1
-    steps += 1000000
-    print('%10s %s' % (steps,4.0*circle/(circle+square)))
+  table = RADICAL_TABLES.get(base)
+  if table is None:
+    digits = 1
+    while base**(digits+1)<=RADICAL_TABLE_SIZE:
+      digits += 1
+    table = np.zeros(base**digits)
+    (rest,scale) = (np.arange(base**digits),1.0/base)
+    while rest.any():
+      table += rest%base*scale
+      rest //= base
+      scale /= base
+    RADICAL_TABLES[base] = table
+
+  index = index.copy()
+  result = np.zeros(len(index))
+  scale = 1.0
+  while index.any():
+    result += table[index%len(table)]*scale
+    index //= len(table)
+    scale /= len(table)
+  return result
+
+RADICAL_TABLE_SIZE = 1<<16
+RADICAL_TABLES = {}
+
+METHODS = {
+  'plain' : sample_batches,
+  'stratified' : sample_stratified,
+  'antithetic' : sample_antithetic,
+  'sobol' : sample_sobol,
+  'halton' : sample_halton,
+}
+
+def estimate(samples,hits):
+
+  return 4.0*hits/samples
+
+# from the binomial variance of the fraction of hits
+def standard_error(samples,hits):
+
+  p = hits/samples
+  return 4*math.sqrt(p*(1-p)/samples)
+
+def confidence_interval(samples,hits,z=Z95):
+
+  (pi,error) = (estimate(samples,hits),standard_error(samples,hits))
+  return (pi-z*error,pi+z*error)
+
+# The points are split into chunks, and chunk i always draws from its own
+# stream seeded with SeedSequence(seed,spawn_key=(i,)), the i-th child that
+# SeedSequence(seed).spawn() would give. Workers return the (samples,hits) of
+# every batch in a chunk and they are added up in order, so the running totals
+# and where a target stops the run only depend on the seed and batch, not on
+# how many workers there are. Yields the running (samples,hits) after every
+# chunk until there have been samples points, or after the first batch that
+# gets the standard error down to target with at least MIN_SAMPLES points and
+# some but not all of them hits, and never stops with neither limit.
+def run(seed,batch=BATCH,samples=None,target=None,workers=1,chunk=CHUNK,
+    method='plain'):
+
+  jobs = chunk_jobs(seed,chunk,batch,samples,method)
+  if workers<=1:
+    results = map(chunk_batches,jobs)
+    pool = None
+  else:
+    pool = ProcessPoolExecutor(workers)
+    results = pool_results(pool,jobs,2*workers)
+
+  (n,hits) = (0,0)
+  try:
+    for batches in results:
+      for (m,h) in batches:
+        n += m
+        hits += h
+        if (target and n>=MIN_SAMPLES and 0<hits<n
+            and standard_error(n,hits)<=target):
+          yield (n,hits)
+          return
+      yield (n,hits)
+  finally:
+    if pool:
+      pool.shutdown(cancel_futures=True)
+
+def chunk_jobs(seed,chunk,batch,samples=None,method='plain'):
+
+  i = 0
+  while samples is None or i*chunk<samples:
+    n = chunk if samples is None else min(chunk,samples-i*chunk)
+    yield (seed,i,n,batch,method)
+    i += 1
+
+# a chunk's batches, sampled only as they are asked for
+def chunk_batches(job):
+
+  (seed,i,n,batch,method) = job
+  rng = generator(np.random.SeedSequence(seed,spawn_key=(i,)))
+  return METHODS[method](n,rng,batch)
+
+def sample_chunk(job):
+
+  return list(chunk_batches(job))
+
+# results of the jobs in order, keeping at most ahead of them running at once
+# so that an endless run doesn't queue up endless jobs
+def pool_results(pool,jobs,ahead):
+
+  pending = deque()
+  for job in jobs:
+    pending.append(pool.submit(sample_chunk,job))
+    if len(pending)>=ahead:
+      yield pending.popleft().result()
+  while pending:
+    yield pending.popleft().result()
+
+def main(argv=None):
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-b','--batch',type=int,default=BATCH,
+      help='points drawn at a time (default %(default)s)')
+  parser.add_argument('-n','--samples',type=int,help='stop after this many points')
+  parser.add_argument('-e','--target',type=float,
+      help='stop once the standard error is this small; it is the error of '
+      'plain sampling, which overstates the error of the other methods')
+  parser.add_argument('-c','--chunk',type=int,default=CHUNK,
+      help='points per independent stream (default %(default)s)')
+  parser.add_argument('-w','--workers',type=int,default=1,
+      help='processes to sample in, 0 for one per core (default %(default)s)')
+  parser.add_argument('-s','--seed',type=int,help='master seed, random by default')
+  parser.add_argument('-m','--method',default='plain',choices=sorted(METHODS),
+      help='how points are picked (default %(default)s)')
+  args = parser.parse_args(argv)
+  if args.batch<1 or args.chunk<1:
+    parser.error('--batch and --chunk must be at least 1')
+
+  # a random seed is printed so that the run can be repeated
+  seed = np.random.SeedSequence(args.seed).entropy
+  print('seed %s' % seed)
+  workers = args.workers or os.cpu_count()
+  tic = time.time()
+  for (n,hits) in run(seed,args.batch,args.samples,args.target,workers,
+      args.chunk,args.method):
+    (low,high) = confidence_interval(n,hits)
+    print('%14s %.10f +/- %.2g  95%% CI %.8f-%.8f  error %.2e  %.3f sec'
+        % (n,estimate(n,hits),standard_error(n,hits),low,high,
+        abs(estimate(n,hits)-math.pi),time.time()-tic))
 
 if __name__=='__main__':
   main()
-